@@ -1,5 +1,5 @@
 import os
-import subprocess
+import asyncio
 import psutil
 import logging
 from typing import List, Dict, Optional
@@ -7,6 +7,101 @@ from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Threat levels that warrant disruptive actions (network isolation, lock)
+ESCALATED_THREAT_LEVELS = frozenset({"high", "critical"})
+
+# Win32 access rights / wait results used by _fast_kill
+PROCESS_TERMINATE = 0x0001
+SYNCHRONIZE = 0x00100000
+WAIT_OBJECT_0 = 0
+
+# _fast_kill outcomes
+KILL_TERMINATED = "terminated"  # TerminateProcess succeeded; do not retry
+KILL_NOT_ATTEMPTED = "not_attempted"  # Not Windows, or no handle; use psutil
+KILL_FAILED = "failed"  # TerminateProcess itself failed
+
+
+def _load_kernel32():
+    """Private kernel32 binding with the prototypes _fast_kill needs (None off Windows)"""
+    try:
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    except (ImportError, AttributeError, OSError):
+        return None
+    
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.TerminateProcess.argtypes = [wintypes.HANDLE, wintypes.UINT]
+    kernel32.TerminateProcess.restype = wintypes.BOOL
+    kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+    kernel32.WaitForSingleObject.restype = wintypes.DWORD
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    kernel32.CloseHandle.restype = wintypes.BOOL
+    return kernel32
+
+
+_kernel32 = _load_kernel32()
+
+
+def _fast_kill(pid: int, timeout_ms: int = 5000) -> str:
+    """
+    Terminate a process with direct kernel32 calls (Windows only).
+    Skips psutil's process hydration; returns one of the KILL_* outcomes.
+    """
+    kernel32 = _kernel32
+    if kernel32 is None:
+        return KILL_NOT_ATTEMPTED
+    
+    handle = kernel32.OpenProcess(PROCESS_TERMINATE | SYNCHRONIZE, False, pid)
+    if not handle:
+        return KILL_NOT_ATTEMPTED
+    
+    try:
+        if not kernel32.TerminateProcess(handle, 1):
+            return KILL_FAILED
+        if kernel32.WaitForSingleObject(handle, timeout_ms) != WAIT_OBJECT_0:
+            # Termination is queued; the process is still unwinding pending I/O
+            logger.warning(f"Process {pid} terminated but had not exited after {timeout_ms} ms")
+        return KILL_TERMINATED
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _psutil_kill(pid: int, timeout: float = 5.0):
+    """Terminate a process through psutil and wait for it to exit (blocking)"""
+    process = psutil.Process(pid)
+    process.terminate()
+    process.wait(timeout=timeout)
+
+
+def _set_network_adapters_wmi(enable: bool) -> tuple:
+    """
+    Enable/disable network adapters in-process via WMI (Windows + pywin32).
+    Avoids spawning powershell.exe during an active incident.
+    Returns (changed, failed) adapter counts.
+    """
+    import pythoncom
+    import win32com.client
+    
+    pythoncom.CoInitialize()
+    try:
+        wmi = win32com.client.GetObject("winmgmts:")
+        query = "SELECT * FROM Win32_NetworkAdapter WHERE NetEnabled = " + ("FALSE" if enable else "TRUE")
+        
+        changed = 0
+        failed = 0
+        for adapter in wmi.ExecQuery(query):
+            return_value = adapter.Enable() if enable else adapter.Disable()
+            if return_value == 0:
+                changed += 1
+            else:
+                failed += 1
+        
+        return changed, failed
+    finally:
+        pythoncom.CoUninitialize()
+
 
 class ContainmentEngine:
     """Automated containment and response actions"""
@@ -16,6 +111,39 @@ class ContainmentEngine:
         self.containment_config = config.get("containment", {})
         self.auto_contain = self.containment_config.get("auto_contain", False)
         self.containment_log = []
+        self._log_lock = asyncio.Lock()
+        self._actions = self._build_action_table()
+    
+    def _build_action_table(self) -> tuple:
+        """
+        Resolve the containment config into the enabled actions once.
+        Each entry is (action name, threat levels or None for any, coroutine factory).
+        """
+        specs = (
+            ("kill_process", True, None, "process_kill",
+             lambda process_info: self.kill_process(process_info)),
+            ("isolate_network", True, ESCALATED_THREAT_LEVELS, "network_isolation",
+             lambda process_info: self.isolate_network()),
+            ("disable_network_drives", True, None, "disable_network_drives",
+             lambda process_info: self.disable_network_drives()),
+            ("lock_system", False, ESCALATED_THREAT_LEVELS, "lock_workstation",
+             lambda process_info: self.lock_workstation()),
+        )
+        
+        return tuple(
+            (action_name, threat_levels, factory)
+            for config_key, default, threat_levels, action_name, factory in specs
+            if self.containment_config.get(config_key, default)
+        )
+    
+    def update_settings(self, settings: dict):
+        """Apply containment setting changes and rebuild the action table"""
+        for key in ("auto_contain", "isolate_network", "kill_process", "disable_network_drives", "lock_system"):
+            if key in settings:
+                self.containment_config[key] = settings[key]
+        
+        self.auto_contain = self.containment_config.get("auto_contain", False)
+        self._actions = self._build_action_table()
     
     async def execute_containment(self, incident_data: dict, auto: bool = False) -> dict:
         """
@@ -34,33 +162,22 @@ class ContainmentEngine:
         
         logger.warning(f"Initiating containment for {threat_level} threat")
         
-        # 1. Kill suspicious process
-        if self.containment_config.get("kill_process", True):
-            result = await self.kill_process(process_info)
-            if result["success"]:
-                actions_taken.append(result)
-            else:
-                actions_failed.append(result)
+        # Actions are independent, so run the enabled ones concurrently:
+        # kill process, disable network drives (any level);
+        # isolate network, lock workstation (high/critical only)
+        actions = [
+            (action_name, factory(process_info))
+            for action_name, threat_levels, factory in self._actions
+            if threat_levels is None or threat_level in threat_levels
+        ]
         
-        # 2. Isolate network (for high/critical threats)
-        if threat_level in ["high", "critical"] and self.containment_config.get("isolate_network", True):
-            result = await self.isolate_network()
-            if result["success"]:
-                actions_taken.append(result)
-            else:
-                actions_failed.append(result)
+        results = await asyncio.gather(*(coro for _, coro in actions), return_exceptions=True)
         
-        # 3. Disable network drives
-        if self.containment_config.get("disable_network_drives", True):
-            result = await self.disable_network_drives()
-            if result["success"]:
-                actions_taken.append(result)
-            else:
-                actions_failed.append(result)
-        
-        # 4. Lock system (for high/critical threats if enabled)
-        if threat_level in ["high", "critical"] and self.containment_config.get("lock_system", False):
-            result = await self.lock_workstation()
+        for (action_name, _), result in zip(actions, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Containment action {action_name} raised: {result}")
+                result = {"action": action_name, "success": False, "error": str(result)}
+            
             if result["success"]:
                 actions_taken.append(result)
             else:
@@ -74,7 +191,8 @@ class ContainmentEngine:
             "auto_triggered": auto
         }
         
-        self.containment_log.append(summary)
+        async with self._log_lock:
+            self.containment_log.append(summary)
         return summary
     
     async def kill_process(self, process_info: dict) -> dict:
@@ -94,9 +212,20 @@ class ContainmentEngine:
             }
         
         try:
-            process = psutil.Process(pid)
-            process.terminate()
-            process.wait(timeout=5)
+            # Method 1: Direct TerminateProcess (Windows fast path)
+            # Method 2: Fallback to psutil (other platforms, or handle denied)
+            # Both block, so they run off the event loop
+            outcome = await asyncio.to_thread(_fast_kill, pid)
+            if outcome == KILL_NOT_ATTEMPTED:
+                await asyncio.to_thread(_psutil_kill, pid)
+            elif outcome == KILL_FAILED:
+                logger.error(f"TerminateProcess failed for {process_name} (PID: {pid})")
+                return {
+                    "action": "process_kill",
+                    "success": False,
+                    "error": "terminate_failed",
+                    "target": process_name
+                }
             
             logger.info(f"Terminated process: {process_name} (PID: {pid})")
             return {
@@ -130,33 +259,91 @@ class ContainmentEngine:
                 "target": process_name
             }
     
+    async def _run_command(self, argv: List[str], timeout: float) -> tuple:
+        """
+        Run a command without blocking the event loop.
+        Returns (returncode, stdout, stderr); kills the process on timeout.
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise TimeoutError(f"{argv[0]} timed out after {timeout}s")
+        
+        return (
+            proc.returncode,
+            stdout.decode(errors='replace'),
+            stderr.decode(errors='replace')
+        )
+    
+    async def _set_network_adapters(self, enable: bool) -> Optional[tuple]:
+        """Toggle adapters via WMI; returns None if WMI is unavailable"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, _set_network_adapters_wmi, enable)
+        except ImportError:
+            return None
+        except Exception as e:
+            logger.warning(f"WMI adapter control failed, falling back to PowerShell: {e}")
+            return None
+    
     async def isolate_network(self) -> dict:
         """Disable network adapters to isolate the system"""
         try:
+            # Method 1: In-process WMI (no process creation)
+            wmi_result = await self._set_network_adapters(enable=False)
+            if wmi_result is not None:
+                changed, failed = wmi_result
+                if not failed:
+                    logger.warning("Network adapters disabled - System isolated")
+                    return {
+                        "action": "network_isolation",
+                        "success": True,
+                        "message": "All network adapters disabled",
+                        "method": "wmi",
+                        "adapters": changed,
+                        "timestamp": datetime.now(timezone.utc).isoformat()
+                    }
+                return {
+                    "action": "network_isolation",
+                    "success": False,
+                    "error": f"{failed} adapter(s) could not be disabled",
+                    "message": "Requires administrator privileges"
+                }
+            
+            # Method 2: Fallback to PowerShell
             # Windows command to disable network adapters
-            cmd = 'powershell "Get-NetAdapter | Where-Object {$_.Status -eq \'Up\'} | Disable-NetAdapter -Confirm:$false"'
+            script = "Get-NetAdapter | Where-Object {$_.Status -eq 'Up'} | Disable-NetAdapter -Confirm:$false"
             
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
+            returncode, _, stderr = await self._run_command(
+                ['powershell', '-NoProfile', '-Command', script],
                 timeout=10
             )
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.warning("Network adapters disabled - System isolated")
                 return {
                     "action": "network_isolation",
                     "success": True,
                     "message": "All network adapters disabled",
+                    "method": "powershell",
                     "timestamp": datetime.now(timezone.utc).isoformat()
                 }
             else:
                 return {
                     "action": "network_isolation",
                     "success": False,
-                    "error": result.stderr,
+                    "error": stderr,
                     "message": "Requires administrator privileges"
                 }
         except Exception as e:
@@ -171,15 +358,7 @@ class ContainmentEngine:
         """Disconnect all network drives"""
         try:
             # Windows command to disconnect network drives
-            cmd = 'net use * /delete /yes'
-            
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+            await self._run_command(['net', 'use', '*', '/delete', '/yes'], timeout=10)
             
             logger.info("Network drives disconnected")
             return {
@@ -216,7 +395,7 @@ class ContainmentEngine:
                 logger.warning(f"ctypes lock failed, trying subprocess: {e}")
             
             # Method 2: Fallback to subprocess
-            subprocess.run(['rundll32.exe', 'user32.dll,LockWorkStation'], timeout=5)
+            await self._run_command(['rundll32.exe', 'user32.dll,LockWorkStation'], timeout=5)
             
             logger.warning("Workstation locked via subprocess")
             return {
@@ -238,28 +417,46 @@ class ContainmentEngine:
     async def restore_network(self) -> dict:
         """Re-enable network adapters"""
         try:
-            cmd = 'powershell "Get-NetAdapter | Where-Object {$_.Status -eq \'Disabled\'} | Enable-NetAdapter -Confirm:$false"'
+            # Method 1: In-process WMI (no process creation)
+            wmi_result = await self._set_network_adapters(enable=True)
+            if wmi_result is not None:
+                changed, failed = wmi_result
+                if not failed:
+                    logger.info("Network adapters re-enabled")
+                    return {
+                        "action": "restore_network",
+                        "success": True,
+                        "message": "Network adapters restored",
+                        "method": "wmi",
+                        "adapters": changed
+                    }
+                return {
+                    "action": "restore_network",
+                    "success": False,
+                    "error": f"{failed} adapter(s) could not be enabled"
+                }
+            
+            # Method 2: Fallback to PowerShell
+            script = "Get-NetAdapter | Where-Object {$_.Status -eq 'Disabled'} | Enable-NetAdapter -Confirm:$false"
             
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
+            returncode, _, stderr = await self._run_command(
+                ['powershell', '-NoProfile', '-Command', script],
                 timeout=10
             )
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info("Network adapters re-enabled")
                 return {
                     "action": "restore_network",
                     "success": True,
-                    "message": "Network adapters restored"
+                    "message": "Network adapters restored",
+                    "method": "powershell"
                 }
             else:
                 return {
                     "action": "restore_network",
                     "success": False,
-                    "error": result.stderr
+                    "error": stderr
                 }
         except Exception as e:
             return {
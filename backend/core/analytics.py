@@ -1,38 +1,133 @@
 import json
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict
+from collections import Counter, OrderedDict
+import mmap
 import os
 
+try:
+    import orjson
+except ImportError:  # Optional C accelerator; stdlib json is used otherwise
+    orjson = None
+
+_loads = orjson.loads if orjson else json.loads
+
+
+def _dumps(obj) -> bytes:
+    """Serialize a single value to compact UTF-8 JSON"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+# Indicator -> attack chain stage (dict order is the reported order)
+_CHAIN_MAP = {
+    'decoy_file_compromised': "Initial Access: Decoy file accessed",
+    'high_entropy': "Encryption: File encryption detected",
+    'rapid_file_modifications': "Impact: Mass file modification",
+    'extension_changed': "Execution: File extension changes",
+}
+
+# Indicator -> security recommendations
+_REC_MAP = {
+    'decoy_file_compromised': (
+        "Deploy additional decoy files in strategic locations",
+    ),
+    'rapid_file_modifications': (
+        "Implement stricter rate limiting on file operations",
+        "Enable process monitoring and behavior analysis",
+    ),
+}
+
 
 class IncidentAnalytics:
     """Analytics engine for incident replay and analysis"""
     
     def __init__(self, log_file='logs/incidents.jsonl'):
         self.log_file = log_file
+        # Parsed incidents keyed by (mtime_ns, size, days) of the log file
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_max_entries = 4
     
     def load_incidents(self, days: int = 30) -> List[dict]:
-        """Load incidents from log file"""
-        incidents = []
+        """Load incidents from log file (chronological order)"""
+        return [incident for _, incident in self._load_timed(days)]
+    
+    def _load_timed(self, days: int) -> List[Tuple[datetime, dict]]:
+        """(parsed timestamp, incident) pairs in chronological order, cached per log state"""
         cutoff_time = datetime.now(timezone.utc) - timedelta(days=days)
         
-        if not os.path.exists(self.log_file):
-            return incidents
+        try:
+            st = os.stat(self.log_file)
+        except OSError:
+            return []
+        
+        if st.st_size == 0:
+            return []
         
+        # Serve repeated queries from memory until the log is appended to
+        cache_key = (st.st_mtime_ns, st.st_size, days)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return [pair for pair in cached if pair[0] >= cutoff_time]
+        
+        timed = []
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        incident = json.loads(line.strip())
-                        incident_time = datetime.fromisoformat(incident['timestamp'])
-                        if incident_time >= cutoff_time:
-                            incidents.append(incident)
-                    except (json.JSONDecodeError, KeyError):
-                        continue
+            timed.extend(self._iter_timed(days))
         except Exception as e:
             print(f"Error loading incidents: {e}")
         
-        return incidents
+        # Restore chronological order
+        timed.reverse()
+        
+        self._cache[cache_key] = timed
+        while len(self._cache) > self._cache_max_entries:
+            self._cache.popitem(last=False)
+        
+        return list(timed)
+    
+    def iter_incidents(self, days: int = 30):
+        """Yield incidents newest-first straight from the log file"""
+        for _, incident in self._iter_timed(days):
+            yield incident
+    
+    def _iter_timed(self, days: int):
+        """
+        Yield (parsed timestamp, incident) newest-first from the log file.
+        The log is append-only (chronological), so it is read backwards
+        and scanning stops at the first incident older than the cutoff.
+        The parsed time travels next to the incident so consumers don't
+        re-parse it, and the incident dicts stay exactly as logged.
+        """
+        cutoff_time = datetime.now(timezone.utc) - timedelta(days=days)
+        
+        if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0:
+            return
+        
+        with open(self.log_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for line in self._iter_lines_reversed(mm):
+                    try:
+                        incident = _loads(line)
+                        incident_time = datetime.fromisoformat(incident['timestamp'])
+                    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, ValueError):
+                        continue
+                    
+                    if incident_time < cutoff_time:
+                        break
+                    yield incident_time, incident
+    
+    @staticmethod
+    def _iter_lines_reversed(mm: mmap.mmap):
+        """Yield non-empty lines of a mapped file from last to first"""
+        end = len(mm)
+        while end > 0:
+            newline = mm.rfind(b'\n', 0, end)
+            line = mm[newline + 1:end].strip()
+            if line:
+                yield line
+            end = newline if newline >= 0 else 0
     
     def replay_incident(self, incident_id: str) -> Optional[dict]:
         """Replay a specific incident with full timeline"""
@@ -74,42 +169,24 @@ class IncidentAnalytics:
     
     def _reconstruct_attack_chain(self, incident: dict) -> List[str]:
         """Reconstruct the attack chain"""
-        chain = []
-        
-        indicators = incident.get('indicators', [])
-        
-        if 'decoy_file_compromised' in indicators:
-            chain.append("Initial Access: Decoy file accessed")
-        
-        if 'high_entropy' in indicators:
-            chain.append("Encryption: File encryption detected")
-        
-        if 'rapid_file_modifications' in indicators:
-            chain.append("Impact: Mass file modification")
-        
-        if 'extension_changed' in indicators:
-            chain.append("Execution: File extension changes")
-        
-        return chain
+        indicators = frozenset(incident.get('indicators', ()))
+        return [stage for indicator, stage in _CHAIN_MAP.items() if indicator in indicators]
     
     def _generate_recommendations(self, incident: dict) -> List[str]:
         """Generate security recommendations based on incident"""
         recommendations = []
         
         threat_level = incident.get('threat_level', 'low')
-        indicators = incident.get('indicators', [])
+        indicators = frozenset(incident.get('indicators', ()))
         
         if threat_level in ['critical', 'high']:
             recommendations.append("Immediate isolation of affected systems")
             recommendations.append("Forensic analysis of affected files")
             recommendations.append("Review and update backup procedures")
         
-        if 'decoy_file_compromised' in indicators:
-            recommendations.append("Deploy additional decoy files in strategic locations")
-        
-        if 'rapid_file_modifications' in indicators:
-            recommendations.append("Implement stricter rate limiting on file operations")
-            recommendations.append("Enable process monitoring and behavior analysis")
+        for indicator, items in _REC_MAP.items():
+            if indicator in indicators:
+                recommendations.extend(items)
         
         recommendations.append("Update anti-malware signatures")
         recommendations.append("Conduct security awareness training")
@@ -118,36 +195,35 @@ class IncidentAnalytics:
     
     def get_statistics(self, days: int = 7) -> dict:
         """Get analytics statistics"""
-        incidents = self.load_incidents(days=days)
+        return self._compute_statistics(self._load_timed(days))
+    
+    def _compute_statistics(self, timed: Iterable[Tuple[datetime, dict]]) -> dict:
+        """Compute statistics over (timestamp, incident) pairs in a single pass"""
+        total = 0
         
-        stats = {
-            'total_incidents': len(incidents),
-            'by_severity': defaultdict(int),
-            'by_type': defaultdict(int),
-            'by_day': defaultdict(int),
-            'most_common_indicators': defaultdict(int),
-            'containment_success_rate': 0.0
-        }
+        by_severity = Counter()
+        by_type = Counter()
+        by_day = Counter()
+        indicators = Counter()
         
         containment_total = 0
         containment_success = 0
         
-        for incident in incidents:
+        for incident_time, incident in timed:
+            total += 1
+            
             # Severity
-            severity = incident.get('threat_level', 'unknown')
-            stats['by_severity'][severity] += 1
+            by_severity[incident.get('threat_level', 'unknown')] += 1
             
             # Type
             incident_type = incident.get('type', 'unknown')
-            stats['by_type'][incident_type] += 1
+            by_type[incident_type] += 1
             
             # Day
-            incident_date = datetime.fromisoformat(incident['timestamp']).date()
-            stats['by_day'][str(incident_date)] += 1
+            by_day[str(incident_time.date())] += 1
             
             # Indicators
-            for indicator in incident.get('indicators', []):
-                stats['most_common_indicators'][indicator] += 1
+            indicators.update(incident.get('indicators', ()))
             
             # Containment success
             if incident_type == 'containment':
@@ -155,34 +231,42 @@ class IncidentAnalytics:
                 if incident.get('success'):
                     containment_success += 1
         
-        if containment_total > 0:
-            stats['containment_success_rate'] = (containment_success / containment_total) * 100
-        
-        # Convert defaultdicts to regular dicts
-        stats['by_severity'] = dict(stats['by_severity'])
-        stats['by_type'] = dict(stats['by_type'])
-        stats['by_day'] = dict(stats['by_day'])
-        stats['most_common_indicators'] = dict(
-            sorted(stats['most_common_indicators'].items(), 
-                   key=lambda x: x[1], 
-                   reverse=True)[:10]
+        stats = {'total_incidents': total}
+        
+        # Convert Counters to regular dicts
+        stats['by_severity'] = dict(by_severity)
+        stats['by_type'] = dict(by_type)
+        stats['by_day'] = dict(by_day)
+        stats['most_common_indicators'] = dict(indicators.most_common(10))
+        stats['containment_success_rate'] = (
+            (containment_success / containment_total) * 100 if containment_total > 0 else 0.0
         )
         
         return stats
     
     def export_report(self, output_file: str, days: int = 7):
-        """Export comprehensive report"""
-        incidents = self.load_incidents(days=days)
-        stats = self.get_statistics(days=days)
-        
-        report = {
-            'generated_at': datetime.now(timezone.utc).isoformat(),
-            'period_days': days,
-            'statistics': stats,
-            'incidents': incidents
-        }
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+        """
+        Export comprehensive report.
+        Incidents are streamed newest-first from the log straight into the
+        file while the statistics are accumulated in the same pass, so memory
+        stays bounded; "statistics" is therefore written after "incidents".
+        """
+        with open(output_file, 'wb') as f:
+            f.write(b'{"generated_at": ' + _dumps(datetime.now(timezone.utc).isoformat()))
+            f.write(b',\n "period_days": ' + _dumps(days))
+            f.write(b',\n "incidents": [')
+            
+            def write_each(timed):
+                separator = b'\n  '
+                for pair in timed:
+                    f.write(separator)
+                    f.write(_dumps(pair[1]))
+                    separator = b',\n  '
+                    yield pair
+            
+            stats = self._compute_statistics(write_each(self._iter_timed(days)))
+            
+            f.write(b'\n ],\n "statistics": ' + _dumps(stats))
+            f.write(b'\n}\n')
         
         return output_file
@@ -3,36 +3,57 @@ Professional Asynchronous Entropy Calculator
 Prevents system freeze during mass file encryption attacks
 """
 
-import math
 import hashlib
 import logging
-from typing import Optional, Dict, Tuple
-from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
-from threading import Lock
+import os
+from typing import Optional, Dict, List, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from threading import Lock, local
 import time
 
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:  # Optional fast hash; SHA-256 is used otherwise
+    xxhash = None
+
 logger = logging.getLogger(__name__)
 
+# Read buffer size for full-file scans (1MB)
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Per-worker read buffers, reused across files
+_buffer_pool = local()
+
 
 class AsyncEntropyCalculator:
     """
     High-performance asynchronous entropy and hash calculator.
-    Uses process pool for parallel calculation without blocking main thread.
+    Uses thread pool for parallel calculation without blocking main thread
+    (hashlib, readinto and numpy release the GIL on large buffers).
     Includes smart caching and sampling for large files.
     """
     
-    def __init__(self, max_workers: int = 4, cache_ttl: int = 300):
+    def __init__(self, max_workers: int = 4, cache_ttl: int = 300, negative_ttl: int = 30,
+                 crypto_hash: bool = False):
         """
         Initialize async entropy calculator.
         
         Args:
-            max_workers: Number of worker processes (default: 4)
+            max_workers: Number of worker threads (default: 4)
             cache_ttl: Cache time to live in seconds (default: 300s = 5min)
+            negative_ttl: Time to live for timed-out lookups (default: 30s)
+            crypto_hash: Use SHA-256 instead of the fast xxh3 content hash
+                         (default: False; enable for forensic exports)
         """
         self.max_workers = max_workers
         self.cache_ttl = cache_ttl
-        self.executor = ProcessPoolExecutor(max_workers=max_workers)
-        self.cache: Dict[str, Tuple[float, Dict]] = {}  # {file_path: (timestamp, result)}
+        self.negative_ttl = negative_ttl
+        self.crypto_hash = crypto_hash
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cache: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()  # {file_path: (timestamp, result)}, LRU order
         self.lock = Lock()
         
         # Performance metrics
@@ -54,17 +75,17 @@ class AsyncEntropyCalculator:
         Returns:
             Dict with entropy, hash, and file info or None
         """
-        # Check cache first
+        # Check cache first (negative entries short-circuit to None)
         cached = self._check_cache(file_path)
-        if cached:
+        if cached is not None:
             self.cache_hits += 1
-            return cached
+            return None if cached.get('__neg__') else cached
         
         self.cache_misses += 1
         
         try:
-            # Submit to process pool
-            future = self.executor.submit(_calculate_file_metrics, file_path)
+            # Submit to thread pool
+            future = self.executor.submit(_calculate_file_metrics, file_path, self.crypto_hash)
             result = future.result(timeout=timeout)
             
             if result:
@@ -76,6 +97,7 @@ class AsyncEntropyCalculator:
         except TimeoutError:
             self.timeouts += 1
             logger.warning(f"Entropy calculation timeout for {file_path}")
+            self._cache_negative(file_path, 'timeout')
             return None
         except Exception as e:
             logger.error(f"Entropy calculation error for {file_path}: {e}")
@@ -93,16 +115,16 @@ class AsyncEntropyCalculator:
         Returns:
             Dict with entropy, hash, and file info
         """
-        # Check cache first
+        # Check cache first (negative entries short-circuit to None)
         cached = self._check_cache(file_path)
-        if cached:
+        if cached is not None:
             self.cache_hits += 1
-            return cached
+            return None if cached.get('__neg__') else cached
         
         self.cache_misses += 1
         
         try:
-            result = _calculate_file_metrics(file_path)
+            result = _calculate_file_metrics(file_path, self.crypto_hash)
             if result:
                 self.calculations_done += 1
                 self._cache_result(file_path, result)
@@ -112,12 +134,66 @@ class AsyncEntropyCalculator:
         
         return None
     
+    def batch_calculate(self, file_paths: List[str], timeout: float = 30.0) -> Dict[str, Optional[Dict]]:
+        """
+        Calculate entropy and hash for many files at once (e.g. during a
+        mass-encryption burst). Cached entries are served directly and the
+        rest are spread across the worker pool.
+        
+        Args:
+            file_paths: Paths to analyze (duplicates are ignored)
+            timeout: Maximum time to wait for the whole batch (default: 30s)
+        
+        Returns:
+            Dict mapping each path to its metrics dict or None
+        """
+        results: Dict[str, Optional[Dict]] = {}
+        futures = {}
+        
+        for file_path in dict.fromkeys(file_paths):
+            cached = self._check_cache(file_path)
+            if cached is not None:
+                self.cache_hits += 1
+                results[file_path] = None if cached.get('__neg__') else cached
+                continue
+            
+            self.cache_misses += 1
+            future = self.executor.submit(_calculate_file_metrics, file_path, self.crypto_hash)
+            futures[future] = file_path
+        
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                file_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Entropy calculation error for {file_path}: {e}")
+                    result = None
+                
+                if result:
+                    self.calculations_done += 1
+                    self._cache_result(file_path, result)
+                results[file_path] = result
+        
+        except TimeoutError:
+            for future, file_path in futures.items():
+                if file_path not in results:
+                    future.cancel()
+                    self.timeouts += 1
+                    self._cache_negative(file_path, 'timeout')
+                    results[file_path] = None
+            logger.warning(f"Batch entropy calculation timeout ({len(futures)} files)")
+        
+        return results
+    
     def _check_cache(self, file_path: str) -> Optional[Dict]:
         """Check if result is in cache and still valid"""
         with self.lock:
             if file_path in self.cache:
                 timestamp, result = self.cache[file_path]
-                if time.time() - timestamp < self.cache_ttl:
+                ttl = self.negative_ttl if result.get('__neg__') else self.cache_ttl
+                if time.time() - timestamp < ttl:
+                    self.cache.move_to_end(file_path)
                     return result
                 else:
                     # Remove expired entry
@@ -129,13 +205,24 @@ class AsyncEntropyCalculator:
         """Cache calculation result"""
         with self.lock:
             self.cache[file_path] = (time.time(), result)
+            self.cache.move_to_end(file_path)
             
-            # Limit cache size (keep most recent 500 entries)
-            if len(self.cache) > 500:
-                # Remove oldest 100 entries
-                sorted_items = sorted(self.cache.items(), key=lambda x: x[1][0])
-                for i in range(100):
-                    del self.cache[sorted_items[i][0]]
+            # Limit cache size (evict least recently used beyond 500 entries)
+            while len(self.cache) > 500:
+                self.cache.popitem(last=False)
+    
+    def _cache_negative(self, file_path: str, reason: str):
+        """
+        Cache a timed-out lookup so hot retries return immediately.
+        Read failures are not cached: a file locked by its writer (e.g. a sharing
+        violation during encryption) must be retried on the next event.
+        """
+        self._cache_result(file_path, {'__neg__': True, 'reason': reason})
+    
+    def invalidate(self, file_path: str):
+        """Drop the cached result for one file (e.g. after it changed on disk)"""
+        with self.lock:
+            self.cache.pop(file_path, None)
     
     def clear_cache(self):
         """Clear all cached results"""
@@ -163,20 +250,19 @@ class AsyncEntropyCalculator:
         logger.info(f"AsyncEntropyCalculator shutdown. Stats: {self.get_stats()}")
 
 
-def _calculate_file_metrics(file_path: str) -> Optional[Dict]:
+def _calculate_file_metrics(file_path: str, crypto: bool = False) -> Optional[Dict]:
     """
-    Calculate entropy and hash for a file (runs in worker process).
+    Calculate entropy and hash for a file (runs in worker thread).
     Smart sampling for large files to maintain performance.
     
     Args:
         file_path: Path to file
+        crypto: Use SHA-256 instead of the fast xxh3 content hash
     
     Returns:
         Dict with entropy, hash, size, etc.
     """
     try:
-        import os
-        
         if not os.path.exists(file_path):
             return None
         
@@ -185,96 +271,145 @@ def _calculate_file_metrics(file_path: str) -> Optional[Dict]:
         # Strategy: Sample large files instead of reading entirely
         # For files > 10MB, sample first 1MB + middle 1MB + last 1MB
         if file_size > 10 * 1024 * 1024:  # 10MB
-            return _calculate_sampled_metrics(file_path, file_size)
+            return _calculate_sampled_metrics(file_path, file_size, crypto)
         else:
-            return _calculate_full_metrics(file_path, file_size)
+            return _calculate_full_metrics(file_path, file_size, crypto)
     
     except Exception as e:
         logger.error(f"Error calculating metrics for {file_path}: {e}")
         return None
 
 
-def _calculate_full_metrics(file_path: str, file_size: int) -> Dict:
+def _new_hasher(crypto: bool = False):
+    """
+    Create the content hasher used for change detection.
+    xxh3_128 is a non-cryptographic hash that is much faster than SHA-256;
+    SHA-256 is used when crypto=True or xxhash is not installed.
+    
+    Returns:
+        (hasher, algorithm name)
+    """
+    if crypto or xxhash is None:
+        return hashlib.sha256(usedforsecurity=False), 'sha256'
+    return xxhash.xxh3_128(), 'xxh3_128'
+
+
+def _get_read_buffer() -> Tuple[bytearray, memoryview]:
+    """Get this worker's reusable read buffer (allocated on first use)"""
+    buffer = getattr(_buffer_pool, 'buffer', None)
+    if buffer is None:
+        buffer = bytearray(READ_BUFFER_SIZE)
+        _buffer_pool.buffer = buffer
+        _buffer_pool.view = memoryview(buffer)
+    
+    return buffer, _buffer_pool.view
+
+
+def _shannon_entropy(byte_frequencies: np.ndarray, total: int) -> float:
+    """Calculate Shannon entropy (bits per byte) from a 256-bucket histogram"""
+    if total <= 0:
+        return 0.0
+    
+    probabilities = byte_frequencies[byte_frequencies > 0] / total
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def _calculate_full_metrics(file_path: str, file_size: int, crypto: bool = False) -> Dict:
     """Calculate full metrics for small/medium files"""
-    sha256_hash = hashlib.sha256()
-    byte_frequencies = [0] * 256
+    file_hash, hash_algo = _new_hasher(crypto)
+    byte_frequencies = np.zeros(256, dtype=np.uint32)
     bytes_read = 0
+    buffer, view = _get_read_buffer()
     
     with open(file_path, "rb") as f:
-        # Read in chunks
-        for chunk in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(chunk)
-            bytes_read += len(chunk)
-            
-            # Count byte frequencies for entropy
-            for byte in chunk:
-                byte_frequencies[byte] += 1
+        _fadvise(f, "POSIX_FADV_SEQUENTIAL")
+        try:
+            # Read in large chunks into the preallocated buffer.
+            # Hash and histogram share one pass; hashlib.file_digest would not
+            # help here (it is the same readinto loop) and would need a second read.
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                
+                chunk = view[:n]
+                file_hash.update(chunk)
+                bytes_read += n
+                
+                # Count byte frequencies for entropy (vectorized)
+                byte_frequencies += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256).astype(np.uint32, copy=False)
+        finally:
+            # Drop scanned pages so they do not evict the hot working set
+            _fadvise(f, "POSIX_FADV_DONTNEED")
     
-    # Calculate Shannon entropy
-    entropy = 0.0
-    if bytes_read > 0:
-        for freq in byte_frequencies:
-            if freq > 0:
-                probability = freq / bytes_read
-                entropy -= probability * math.log2(probability)
+    entropy = _shannon_entropy(byte_frequencies, bytes_read)
     
     return {
         'entropy': round(entropy, 4),
-        'hash': sha256_hash.hexdigest(),
+        'hash': file_hash.hexdigest(),
+        'hash_algo': hash_algo,
         'size': file_size,
         'sampled': False,
         'bytes_analyzed': bytes_read
     }
 
 
-def _calculate_sampled_metrics(file_path: str, file_size: int) -> Dict:
+def _fadvise(f, advice: str):
+    """Give the kernel a page-cache hint for an open file (no-op where unsupported)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    
+    try:
+        os.posix_fadvise(f.fileno(), 0, 0, getattr(os, advice))
+    except OSError:
+        pass
+
+
+def _calculate_sampled_metrics(file_path: str, file_size: int, crypto: bool = False) -> Dict:
     """
     Calculate metrics using smart sampling for large files.
     Samples: First 1MB + Middle 1MB + Last 1MB
     """
-    sha256_hash = hashlib.sha256()
-    byte_frequencies = [0] * 256
-    sample_size = 1024 * 1024  # 1MB per sample
+    file_hash, hash_algo = _new_hasher(crypto)
+    byte_frequencies = np.zeros(256, dtype=np.uint32)
+    sample_size = READ_BUFFER_SIZE  # 1MB per sample, read into the worker buffer
     bytes_analyzed = 0
     
+    # Sample regions: first, middle (if the file is big enough), last
+    regions = [(0, sample_size)]
+    if file_size > sample_size * 2:
+        regions.append(((file_size - sample_size) // 2, sample_size))
+    if file_size > sample_size:
+        regions.append((max(0, file_size - sample_size), sample_size))
+    
+    buffer, view = _get_read_buffer()
+    
     with open(file_path, "rb") as f:
-        # Sample 1: First 1MB
-        chunk = f.read(sample_size)
-        sha256_hash.update(chunk)
-        bytes_analyzed += len(chunk)
-        for byte in chunk:
-            byte_frequencies[byte] += 1
-        
-        # Sample 2: Middle 1MB
-        if file_size > sample_size * 2:
-            middle_pos = (file_size - sample_size) // 2
-            f.seek(middle_pos)
-            chunk = f.read(sample_size)
-            sha256_hash.update(chunk)
-            bytes_analyzed += len(chunk)
-            for byte in chunk:
-                byte_frequencies[byte] += 1
-        
-        # Sample 3: Last 1MB
-        if file_size > sample_size:
-            f.seek(max(0, file_size - sample_size))
-            chunk = f.read(sample_size)
-            sha256_hash.update(chunk)
-            bytes_analyzed += len(chunk)
-            for byte in chunk:
-                byte_frequencies[byte] += 1
+        _fadvise(f, "POSIX_FADV_SEQUENTIAL")
+        try:
+            # Positioned reads into the worker buffer, not mmap: a file truncated
+            # while it is sampled (e.g. by ransomware) just yields a short read,
+            # where touching a mapped page past the new end raises SIGBUS on POSIX
+            for offset, size in regions:
+                f.seek(offset)
+                n = f.readinto(view[:size])
+                if not n:
+                    break
+                
+                region = view[:n]
+                file_hash.update(region)
+                bytes_analyzed += n
+                byte_frequencies += np.bincount(np.frombuffer(region, dtype=np.uint8), minlength=256).astype(np.uint32, copy=False)
+        finally:
+            # Drop scanned pages so they do not evict the hot working set
+            _fadvise(f, "POSIX_FADV_DONTNEED")
     
-    # Calculate Shannon entropy
-    entropy = 0.0
-    if bytes_analyzed > 0:
-        for freq in byte_frequencies:
-            if freq > 0:
-                probability = freq / bytes_analyzed
-                entropy -= probability * math.log2(probability)
+    entropy = _shannon_entropy(byte_frequencies, bytes_analyzed)
     
     return {
         'entropy': round(entropy, 4),
-        'hash': sha256_hash.hexdigest(),
+        'hash': file_hash.hexdigest(),
+        'hash_algo': hash_algo,
         'size': file_size,
         'sampled': True,
         'bytes_analyzed': bytes_analyzed,
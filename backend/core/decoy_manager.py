@@ -3,12 +3,90 @@ import random
 import string
 import hashlib
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+_ALPHABET = np.frombuffer((string.ascii_letters + string.digits).encode('ascii'), dtype=np.uint8)
+_rng = np.random.default_rng()
+
+# Fixed decoy templates, built once at import
+_TXT_RECORDS = 50
+_TXT_RECORD_LENGTH = 20
+_TXT_TEMPLATE = (
+    b"CONFIDENTIAL DOCUMENT\n\n"
+    b"Financial Records 2024\n"
+    b"Employee Database\n"
+    + b"\n".join(b"Record %d: %%s" % i for i in range(_TXT_RECORDS))
+)
+
+# Minimal PDF structure
+_PDF_BLOB = b"""%PDF-1.4
+1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj
+2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj
+3 0 obj << /Type /Page /Parent 2 0 R /Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> /MediaBox [0 0 612 792] /Contents 4 0 R >> endobj
+4 0 obj << /Length 44 >> stream
+BT /F1 12 Tf 100 700 Td (Confidential Data) Tj ET
+endstream endobj
+xref
+0 5
+0000000000 65535 f
+0000000009 00000 n
+0000000058 00000 n
+0000000115 00000 n
+0000000314 00000 n
+trailer << /Size 5 /Root 1 0 R >>
+startxref
+407
+%%EOF"""
+
+# Minimal JPEG header / end-of-image marker
+_JPG_PREFIX = b'\xFF\xD8\xFF\xE0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+_JPG_SUFFIX = b'\xFF\xD9'
+
+
+def _random_strings(rows: int, length: int) -> np.ndarray:
+    """Generate a (rows, length) table of random alphanumeric bytes"""
+    return _ALPHABET[_rng.integers(0, len(_ALPHABET), size=(rows, length))]
+
+
+def _txt_content(random_bytes) -> bytes:
+    records = _random_strings(_TXT_RECORDS, _TXT_RECORD_LENGTH)
+    return _TXT_TEMPLATE % tuple(records.view(f'S{_TXT_RECORD_LENGTH}').ravel())
+
+
+def _office_content(random_bytes) -> bytes:
+    # Random binary data mimicking Office files
+    return random_bytes(random.randint(1024, 4096))
+
+
+def _jpg_content(random_bytes) -> bytes:
+    return _JPG_PREFIX + random_bytes(2048) + _JPG_SUFFIX
+
+
+def _generic_content(random_bytes) -> bytes:
+    # Generic binary content
+    return random_bytes(random.randint(512, 2048))
+
+
+_CONTENT_BUILDERS = {
+    "txt": _txt_content,
+    "pdf": lambda random_bytes: _PDF_BLOB,
+    "docx": _office_content,
+    "xlsx": _office_content,
+    "jpg": _jpg_content,
+}
+
+
+def _sha256(data: bytes = b''):
+    """SHA-256 for integrity checks (skips FIPS usage indicators on OpenSSL builds)"""
+    return hashlib.sha256(data, usedforsecurity=False)
+
 
 class DecoyFileManager:
     """Creates and manages decoy/honeypot files to detect ransomware"""
@@ -16,6 +94,7 @@ class DecoyFileManager:
     def __init__(self, decoy_config: dict):
         self.config = decoy_config
         self.decoy_registry: Dict[str, dict] = {}
+        self.hash_index: Dict[str, str] = {}  # hash -> path
         self.decoy_dir = "C:\\Users\\Public\\Documents\\RansomwareDefense\\Decoys"
         
     def create_decoy_files(self, count: int = 50) -> List[dict]:
@@ -26,32 +105,48 @@ class DecoyFileManager:
         file_types = self.config.get("file_types", ["pdf", "docx", "xlsx", "jpg", "txt"])
         naming_patterns = self.config.get("naming_patterns", ["Document", "File", "Data"])
         
-        for i in range(count):
-            file_type = random.choice(file_types)
-            name_pattern = random.choice(naming_patterns)
-            
-            filename = f"{name_pattern}_{random.randint(1000, 9999)}.{file_type}"
-            file_path = os.path.join(self.decoy_dir, filename)
+        # One urandom call for the whole batch; each decoy takes at most 4 KiB
+        pool = memoryview(os.urandom(count * 4096))
+        cursor = 0
+        
+        def take(n: int) -> bytes:
+            nonlocal cursor
+            chunk = pool[cursor:cursor + n]
+            cursor += n
+            return chunk.tobytes()
+        
+        created_at = datetime.now(timezone.utc).isoformat()
+        
+        # Draw every random choice for the batch up front
+        types = random.choices(file_types, k=count)
+        names = random.choices(naming_patterns, k=count)
+        numbers = random.choices(range(1000, 10000), k=count)
+        paths = [
+            os.path.join(self.decoy_dir, f"{name}_{number}.{file_type}")
+            for name, number, file_type in zip(names, numbers, types)
+        ]
+        
+        for file_type, file_path in zip(types, paths):
             
             try:
                 # Create decoy with realistic content
-                content = self._generate_decoy_content(file_type)
+                content = self._generate_decoy_content(file_type, take)
                 
                 with open(file_path, 'wb') as f:
                     f.write(content)
                 
                 # Calculate hash
-                file_hash = hashlib.sha256(content).hexdigest()
+                file_hash = _sha256(content).hexdigest()
                 
                 decoy_info = {
                     "path": file_path,
                     "hash": file_hash,
                     "type": file_type,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "created_at": created_at,
                     "size": len(content)
                 }
                 
-                self.decoy_registry[file_path] = decoy_info
+                self._register_decoy(decoy_info)
                 created_decoys.append(decoy_info)
                 
             except Exception as e:
@@ -60,64 +155,49 @@ class DecoyFileManager:
         logger.info(f"Created {len(created_decoys)} decoy files")
         return created_decoys
     
-    def _generate_decoy_content(self, file_type: str) -> bytes:
-        """Generate realistic decoy file content"""
-        
-        if file_type == "txt":
-            content = "CONFIDENTIAL DOCUMENT\n\n"
-            content += "Financial Records 2024\n"
-            content += "Employee Database\n"
-            content += "\n".join([f"Record {i}: {self._random_string(20)}" for i in range(50)])
-            return content.encode('utf-8')
-        
-        elif file_type == "pdf":
-            # Minimal PDF structure
-            pdf_content = b"""%PDF-1.4
-1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj
-2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj
-3 0 obj << /Type /Page /Parent 2 0 R /Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> /MediaBox [0 0 612 792] /Contents 4 0 R >> endobj
-4 0 obj << /Length 44 >> stream
-BT /F1 12 Tf 100 700 Td (Confidential Data) Tj ET
-endstream endobj
-xref
-0 5
-0000000000 65535 f
-0000000009 00000 n
-0000000058 00000 n
-0000000115 00000 n
-0000000314 00000 n
-trailer << /Size 5 /Root 1 0 R >>
-startxref
-407
-%%EOF"""
-            return pdf_content
-        
-        elif file_type in ["docx", "xlsx"]:
-            # Random binary data mimicking Office files
-            return os.urandom(random.randint(1024, 4096))
-        
-        elif file_type == "jpg":
-            # Minimal JPEG header
-            jpg_header = b'\xFF\xD8\xFF\xE0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
-            return jpg_header + os.urandom(2048) + b'\xFF\xD9'
-        
-        else:
-            # Generic binary content
-            return os.urandom(random.randint(512, 2048))
+    def _generate_decoy_content(self, file_type: str, random_bytes=os.urandom) -> bytes:
+        """
+        Generate realistic decoy file content.
+        random_bytes(n) supplies random payload bytes (a slice of a
+        pre-generated pool when called from create_decoy_files).
+        """
+        return _CONTENT_BUILDERS.get(file_type, _generic_content)(random_bytes)
+    
+    def _register_decoy(self, decoy_info: dict):
+        """Add a decoy to the path registry and the hash index"""
+        file_path = decoy_info["path"]
+        previous = self.decoy_registry.get(file_path)
+        if previous is not None:
+            self.hash_index.pop(previous["hash"], None)
+        self.decoy_registry[file_path] = decoy_info
+        self.hash_index[decoy_info["hash"]] = file_path
+    
+    def remove_decoy_entry(self, file_path: str) -> bool:
+        """Drop a decoy from the registry and hash index (file is left untouched)"""
+        decoy_info = self.decoy_registry.pop(file_path, None)
+        if decoy_info is None:
+            return False
+        if self.hash_index.get(decoy_info["hash"]) == file_path:
+            del self.hash_index[decoy_info["hash"]]
+        return True
     
-    def _random_string(self, length: int) -> str:
-        """Generate random string"""
-        return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+    def get_decoy_by_hash(self, file_hash: str) -> Optional[dict]:
+        """Look up a decoy by its original content hash (latest decoy wins for identical content)"""
+        file_path = self.hash_index.get(file_hash)
+        if file_path is None:
+            return None
+        return self.decoy_registry.get(file_path)
     
     def verify_decoy(self, file_path: str) -> dict:
         """Verify if a decoy file has been tampered with"""
-        if file_path not in self.decoy_registry:
+        original_info = self.decoy_registry.get(file_path)
+        if original_info is None:
             return {"is_decoy": False, "compromised": False}
         
-        original_info = self.decoy_registry[file_path]
-        
         try:
-            if not os.path.exists(file_path):
+            try:
+                current_size = os.stat(file_path).st_size
+            except FileNotFoundError:
                 return {
                     "is_decoy": True,
                     "compromised": True,
@@ -125,10 +205,26 @@ startxref
                     "original_hash": original_info["hash"]
                 }
             
-            with open(file_path, 'rb') as f:
-                current_content = f.read()
+            # A size change proves tampering without hashing anything
+            if current_size != original_info["size"]:
+                return {
+                    "is_decoy": True,
+                    "compromised": True,
+                    "reason": "size_mismatch",
+                    "original_hash": original_info["hash"],
+                    "original_size": original_info["size"],
+                    "current_size": current_size
+                }
             
-            current_hash = hashlib.sha256(current_content).hexdigest()
+            # Stream the file through the digest instead of loading it whole
+            with open(file_path, 'rb', buffering=0) as f:
+                if hasattr(hashlib, 'file_digest'):
+                    current_hash = hashlib.file_digest(f, _sha256).hexdigest()
+                else:
+                    sha256_hash = _sha256()
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        sha256_hash.update(block)
+                    current_hash = sha256_hash.hexdigest()
             
             if current_hash != original_info["hash"]:
                 return {
@@ -154,6 +250,20 @@ startxref
                 "error": str(e)
             }
     
+    def verify_decoys_batch(self, file_paths: Optional[Iterable[str]] = None,
+                            max_workers: int = 2) -> Dict[str, dict]:
+        """
+        Verify many decoys at once (all registered decoys by default).
+        hashlib releases the GIL while digesting, so two workers keep
+        two SHA-256 streams in flight on separate cores.
+        """
+        paths = list(self.decoy_registry if file_paths is None else file_paths)
+        if len(paths) < 2:
+            return {path: self.verify_decoy(path) for path in paths}
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(paths, executor.map(self.verify_decoy, paths)))
+    
     def is_decoy_file(self, file_path: str) -> bool:
         """Check if a file is a decoy"""
         return file_path in self.decoy_registry
@@ -161,7 +271,7 @@ startxref
     def cleanup_decoys(self):
         """Remove all decoy files"""
         removed = 0
-        for file_path in list(self.decoy_registry.keys()):
+        for file_path in self.decoy_registry:
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
@@ -170,5 +280,6 @@ startxref
                 logger.error(f"Failed to remove decoy {file_path}: {e}")
         
         self.decoy_registry.clear()
+        self.hash_index.clear()
         logger.info(f"Removed {removed} decoy files")
         return removed
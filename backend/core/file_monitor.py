@@ -1,19 +1,84 @@
 import hashlib
 import math
 import os
+import re
 import asyncio
-from typing import Dict, List, Optional, Set
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime, timezone
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 import psutil
 import logging
+import threading
+import time
 from core.process_cache import get_process_cache
 from core.async_entropy import get_entropy_calculator
 from core.whitelist_manager import get_whitelist_manager
+from core import win_fs_watcher
 
 logger = logging.getLogger(__name__)
 
+# Skip temporary, system files, and database files (matched against the lower-cased path)
+SKIP_PATTERNS = [
+    'tmp', 'temp', '$recycle',
+    '.db-shm', '.db-wal', '.db-journal',  # SQLite temp files
+    '.db',  # All database files
+    'ransomware_defense.db',  # Our own database
+    'file_backups',  # Don't monitor backup folder itself!
+    '\\logs\\',  # Skip log files
+    '__pycache__',  # Skip Python cache
+    '.git',  # Skip git files
+    '\\data\\',  # Skip data folder
+    '\\backend\\data\\',  # Skip backend data folder
+    'sami6_v2'  # Skip our project folders
+]
+PROJECT_MARKERS = frozenset(['backend', 'frontend', 'sami6'])
+
+# All patterns are compiled once into single-pass regex scans
+_SKIP_RE = re.compile('|'.join(map(re.escape, SKIP_PATTERNS)))
+_USER_DIR_LOWER_RE = re.compile(r'\\(?:documents|desktop|pictures|downloads|videos)\\')
+# Lower-case prefixes for str.startswith (Program Files also covers "(x86)")
+SYSTEM_PREFIXES = ('c:\\windows\\', 'c:\\program files')
+
+BASELINE_BATCH_SIZE = 256
+
+# Editors emit several events per save; repeats inside this window are dropped
+DEBOUNCE_NS = 100_000_000  # 100 ms
+DEBOUNCE_PRUNE_NS = 5_000_000_000  # forget entries older than 5 s
+
+
+def _new_observer():
+    """Native ReadDirectoryChangesW observer on Windows, watchdog's Observer elsewhere"""
+    if win_fs_watcher.is_supported():
+        return win_fs_watcher.NativeObserver()
+    return Observer()
+
+
+def format_timestamp_ns(ns: int) -> str:
+    """Convert an epoch-nanosecond event timestamp to an ISO-8601 UTC string"""
+    return datetime.fromtimestamp(ns / 1e9, timezone.utc).isoformat()
+
+
+def _walk_files(path: str):
+    """
+    Yield os.DirEntry objects for every file under path.
+    os.scandir returns size/mtime with the directory listing on Windows,
+    so no per-file stat() call is needed.
+    """
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from _walk_files(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+                except OSError:
+                    continue
+    except OSError:
+        return
+
 
 class FileIntegrityMonitor:
     """File Integrity Monitoring with hash tracking and entropy analysis"""
@@ -22,6 +87,33 @@ class FileIntegrityMonitor:
         self.file_hashes: Dict[str, str] = {}
         self.file_metadata: Dict[str, dict] = {}
         self.monitored_paths: Set[str] = set()
+        # path -> (st_mtime_ns, st_size, metrics); skips re-hashing untouched files
+        self._metrics_memo: "OrderedDict[str, Tuple[int, int, Dict]]" = OrderedDict()
+        self._metrics_memo_size = 10000
+    
+    def _get_file_metrics_cached(self, file_path: str, stat_info: os.stat_result) -> Dict:
+        """Return hash/entropy, recomputing only when mtime or size changed"""
+        key = (stat_info.st_mtime_ns, stat_info.st_size)
+        memo = self._metrics_memo.get(file_path)
+        if memo is not None and memo[:2] == key:
+            self._metrics_memo.move_to_end(file_path)
+            return memo[2]
+        
+        if memo is not None:
+            # File really changed; don't let the entropy TTL cache serve the old hash
+            get_entropy_calculator().invalidate(file_path)
+        
+        metrics = self.get_file_metrics(file_path)
+        if metrics["hash"]:
+            self._remember_metrics(file_path, stat_info, metrics)
+        return metrics
+    
+    def _remember_metrics(self, file_path: str, stat_info: os.stat_result, metrics: Dict):
+        """Store metrics in the (mtime, size) memo"""
+        self._metrics_memo[file_path] = (stat_info.st_mtime_ns, stat_info.st_size, metrics)
+        self._metrics_memo.move_to_end(file_path)
+        while len(self._metrics_memo) > self._metrics_memo_size:
+            self._metrics_memo.popitem(last=False)
     
     def get_file_metrics(self, file_path: str) -> Dict:
         """Get both hash and entropy in a single optimized call"""
@@ -42,7 +134,7 @@ class FileIntegrityMonitor:
         """Get comprehensive file information"""
         try:
             stat_info = os.stat(file_path)
-            metrics = self.get_file_metrics(file_path)
+            metrics = self._get_file_metrics_cached(file_path, stat_info)
             
             return {
                 "path": file_path,
@@ -64,6 +156,44 @@ class FileIntegrityMonitor:
             self.file_hashes[file_path] = info["hash"]
             self.file_metadata[file_path] = info
     
+    def update_baseline_batch(self, entries: List[os.DirEntry]):
+        """Update baseline hashes for many files at once (e.g. from a scandir walk)"""
+        # Stat before hashing: a file modified while it is hashed must not get
+        # its old hash memoized under the new (mtime_ns, size)
+        stats_before = {}
+        for entry in entries:
+            try:
+                stats_before[entry.path] = entry.stat()
+            except OSError:
+                continue
+        
+        results = get_entropy_calculator().batch_calculate(list(stats_before))
+        
+        for entry in entries:
+            stat_info = stats_before.get(entry.path)
+            result = results.get(entry.path)
+            if stat_info is None or not result or not result.get('hash'):
+                continue
+            try:
+                stat_after = os.stat(entry.path)
+            except OSError:
+                continue
+            if (stat_after.st_mtime_ns, stat_after.st_size) != (stat_info.st_mtime_ns, stat_info.st_size):
+                continue  # Changed during hashing; its modify event will re-baseline it
+            
+            metrics = {"hash": result['hash'], "entropy": result.get('entropy')}
+            self._remember_metrics(entry.path, stat_info, metrics)
+            self.file_hashes[entry.path] = metrics["hash"]
+            self.file_metadata[entry.path] = {
+                "path": entry.path,
+                "hash": metrics["hash"],
+                "size": stat_info.st_size,
+                "modified": datetime.fromtimestamp(stat_info.st_mtime),
+                "created": datetime.fromtimestamp(stat_info.st_ctime),
+                "entropy": metrics["entropy"],
+                "extension": os.path.splitext(entry.name)[1].lower()
+            }
+    
     def verify_integrity(self, file_path: str) -> dict:
         """
         Verify file integrity against baseline.
@@ -133,6 +263,9 @@ class RansomwareEventHandler(FileSystemEventHandler):
         self.cache_time = 10  # Cache for 10 seconds (increased for performance)
         self.directory_activity = {}  # Track which processes are active in which directories
         self.last_process_per_dir = {}  # Remember last known process per directory
+        self._debounce: Dict[Tuple[str, str], int] = {}  # (event type, path) -> last monotonic ns
+        self._debounce_pruned = time.monotonic_ns()
+        self._debounce_lock = threading.Lock()  # Shared by every observer thread
     
     def get_process_info(self, file_path: str = None) -> dict:
         """Get information about the process that triggered the event (OPTIMIZED)"""
@@ -167,36 +300,47 @@ class RansomwareEventHandler(FileSystemEventHandler):
         if not event.is_directory:
             self._handle_event("moved", event.dest_path, event.src_path)
     
+    def _is_duplicate(self, event_type: str, file_path: str) -> bool:
+        """
+        True if the same event hit the same path within the debounce window.
+        Only events that pass restart the window, so a steady stream of writes
+        still gets through once per window instead of being suppressed forever.
+        """
+        now = time.monotonic_ns()
+        key = (event_type, file_path)
+        with self._debounce_lock:
+            last = self._debounce.get(key)
+            if last is not None and now - last < DEBOUNCE_NS:
+                return True
+            self._debounce[key] = now
+            
+            # Opportunistic pruning keeps the table bounded without a timer thread
+            if now - self._debounce_pruned > DEBOUNCE_PRUNE_NS:
+                cutoff = now - DEBOUNCE_PRUNE_NS
+                self._debounce = {k: t for k, t in self._debounce.items() if t > cutoff}
+                self._debounce_pruned = now
+        
+        return False
+    
     def _handle_event(self, event_type: str, file_path: str, old_path: str = None):
         """Handle file system event"""
         try:
-            # Skip temporary, system files, and database files
-            skip_patterns = [
-                'tmp', 'temp', '$recycle',
-                '.db-shm', '.db-wal', '.db-journal',  # SQLite temp files
-                '.db',  # All database files
-                'ransomware_defense.db',  # Our own database
-                'file_backups',  # Don't monitor backup folder itself!
-                '\\logs\\',  # Skip log files
-                '__pycache__',  # Skip Python cache
-                '.git',  # Skip git files
-                '\\data\\',  # Skip data folder
-                '\\backend\\data\\',  # Skip backend data folder
-                'sami6_v2'  # Skip our project folders
-            ]
+            if self._is_duplicate(event_type, file_path):
+                return
+            
+            file_path_lower = file_path.lower()
             
             # Skip if path contains project directory
-            if any(x in file_path.lower() for x in skip_patterns):
+            if _SKIP_RE.search(file_path_lower):
                 return
             
             # Extra check: Skip if it's inside the project's own directory
             try:
-                project_markers = ['backend', 'frontend', 'sami6']
-                path_parts = file_path.lower().split('\\')
+                path_parts = file_path_lower.split('\\')
                 # If file is inside project folder structure, skip it
-                if any(marker in path_parts for marker in project_markers):
+                if not PROJECT_MARKERS.isdisjoint(path_parts):
                     # But allow user folders even if they contain these words
-                    if not any(user_folder in file_path.lower() for user_folder in ['\\documents\\', '\\desktop\\', '\\pictures\\', '\\downloads\\', '\\videos\\']):
+                    if not _USER_DIR_LOWER_RE.search(file_path_lower):
                         return
             except Exception:
                 pass
@@ -204,18 +348,13 @@ class RansomwareEventHandler(FileSystemEventHandler):
             # فحص نوع المراقبة المفعل
             if self.monitoring_config:
                 # إذا كان الملف من ملفات النظام
-                is_system_file = any(sys_path in file_path for sys_path in [
-                    'C:\\Windows', 'C:\\Program Files'
-                ])
+                is_system_file = file_path_lower.startswith(SYSTEM_PREFIXES)
                 
                 if is_system_file and not self.monitoring_config.is_system_files_enabled():
                     return  # تجاهل ملفات النظام إذا كانت معطلة
                 
                 # إذا كان الملف من ملفات المستخدم
-                is_user_file = any(user_path in file_path for user_path in [
-                    '\\Documents\\', '\\Desktop\\', '\\Pictures\\', 
-                    '\\Downloads\\', '\\Videos\\'
-                ])
+                is_user_file = _USER_DIR_LOWER_RE.search(file_path_lower) is not None
                 
                 if is_user_file and not self.monitoring_config.is_user_files_enabled():
                     return  # تجاهل ملفات المستخدم إذا كانت معطلة
@@ -225,7 +364,7 @@ class RansomwareEventHandler(FileSystemEventHandler):
                 "type": event_type,
                 "path": file_path,
                 "old_path": old_path,
-                "timestamp": datetime.now(timezone.utc)
+                "timestamp": time.time_ns()  # epoch ns; formatted only when serialized
             }
             
             # Call the callback (it will handle the heavy lifting asynchronously)
@@ -238,8 +377,10 @@ class RansomwareEventHandler(FileSystemEventHandler):
 class FileSystemMonitor:
     """Main file system monitoring orchestrator"""
     
-    def __init__(self, protected_paths: List[str], callback, loop=None, file_protector=None, monitoring_config=None):
+    def __init__(self, protected_paths: List[str], callback, loop=None, file_protector=None, monitoring_config=None,
+                 prime_baseline: bool = False):
         self.protected_paths = protected_paths
+        self.prime_baseline = prime_baseline
         self.callback = callback
         self.loop = loop
         self.file_protector = file_protector
@@ -268,7 +409,7 @@ class FileSystemMonitor:
         
         for path in self.protected_paths:
             if os.path.exists(path):
-                observer = Observer()
+                observer = _new_observer()
                 observer.schedule(
                     self.event_handler,
                     path,
@@ -281,6 +422,35 @@ class FileSystemMonitor:
                 logger.warning(f"Path does not exist: {path}")
         
         self.is_running = True
+        
+        if self.prime_baseline:
+            threading.Thread(
+                target=self._prime_baseline, name="BaselineScan", daemon=True
+            ).start()
+    
+    def _prime_baseline(self):
+        """Walk protected paths once and record baseline hashes in batches"""
+        file_monitor = self.event_handler.file_monitor
+        total = 0
+        batch = []
+        
+        for path in list(self.protected_paths):
+            for entry in _walk_files(path):
+                if not self.is_running:
+                    return
+                if _SKIP_RE.search(entry.path.lower()):
+                    continue
+                batch.append(entry)
+                if len(batch) >= BASELINE_BATCH_SIZE:
+                    file_monitor.update_baseline_batch(batch)
+                    total += len(batch)
+                    batch = []
+        
+        if batch:
+            file_monitor.update_baseline_batch(batch)
+            total += len(batch)
+        
+        logger.info(f"Baseline scan complete: {total} files")
     
     def stop(self):
         """Stop all monitoring"""
@@ -296,7 +466,7 @@ class FileSystemMonitor:
         if path not in self.protected_paths and os.path.exists(path):
             self.protected_paths.append(path)
             if self.is_running:
-                observer = Observer()
+                observer = _new_observer()
                 observer.schedule(
                     self.event_handler,
                     path,
@@ -8,12 +8,42 @@ import shutil
 import hashlib
 import json
 import logging
+import sqlite3
+import tempfile
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Dict, Optional
 
+try:
+    import orjson
+except ImportError:  # مسرّع اختياري؛ يُستخدم json القياسي بدونه
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+_loads = orjson.loads if orjson else json.loads
+
+_BACKUP_COLUMNS = "original_path, backup_path, timestamp, file_hash, file_size"
+
+_REGISTRY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    original_path TEXT NOT NULL,
+    backup_path TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    file_size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backups_original ON backups (original_path, id);
+DROP TABLE IF EXISTS hash_cache;
+"""
+
+
+def _sha256(data: bytes = b''):
+    """SHA-256 لفحص السلامة (بدون مؤشرات FIPS في OpenSSL)"""
+    return hashlib.sha256(data, usedforsecurity=False)
+
 
 class FileProtector:
     """نظام حماية الملفات بالنسخ الاحتياطي التلقائي"""
@@ -25,11 +55,14 @@ class FileProtector:
         self.protected_extensions = config.get("protected_extensions", [
             ".docx", ".xlsx", ".pdf", ".txt", ".jpg", ".png"
         ])
-        self.backup_registry: Dict[str, List[dict]] = {}
-        
         # إنشاء مجلد النسخ الاحتياطي
         os.makedirs(self.backup_dir, exist_ok=True)
         
+        # سجل النسخ في SQLite (WAL): إضافة O(1) وبحث مفهرس بدل إعادة كتابة JSON
+        self.registry_db = os.path.join(self.backup_dir, "backup_registry.db")
+        self._db_lock = threading.Lock()
+        self._db = self._open_registry()
+        
         # تحميل السجل
         self._load_registry()
     
@@ -51,37 +84,36 @@ class FileProtector:
             if not self.should_protect_file(file_path):
                 return None
             
-            # حساب hash الملف
-            file_hash = self._calculate_hash(file_path)
-            
-            # إنشاء اسم فريد للنسخة الاحتياطية
+            st = os.stat(file_path)
             timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
             filename = os.path.basename(file_path)
-            backup_name = f"{timestamp}_{file_hash[:8]}_{filename}"
-            backup_path = os.path.join(self.backup_dir, backup_name)
             
-            # نسخ الملف
-            shutil.copy2(file_path, backup_path)
+            # قراءة واحدة للملف: حساب الـ hash والنسخ معاً، ثم إعادة التسمية.
+            # الـ hash المسجل هو دائماً hash البايتات المنسوخة فعلاً
+            # اسم مؤقت فريد: النسخ المتزامنة لملفات بنفس الاسم لا تتصادم
+            fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.backup_dir)
+            os.close(fd)
+            try:
+                file_hash = self._copy_and_hash(file_path, tmp_path)
+                backup_name = f"{timestamp}_{file_hash[:8]}_{filename}"
+                backup_path = os.path.join(self.backup_dir, backup_name)
+                os.replace(tmp_path, backup_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
             
             backup_info = {
                 "original_path": file_path,
                 "backup_path": backup_path,
                 "timestamp": timestamp,
                 "file_hash": file_hash,
-                "file_size": os.path.getsize(file_path)
+                "file_size": st.st_size
             }
             
-            # تحديث السجل
-            if file_path not in self.backup_registry:
-                self.backup_registry[file_path] = []
-            
-            self.backup_registry[file_path].append(backup_info)
-            
-            # الاحتفاظ بعدد محدود من النسخ
-            self._cleanup_old_backups(file_path)
-            
-            # حفظ السجل
-            self._save_registry()
+            # تحديث السجل والاحتفاظ بعدد محدود من النسخ
+            old_backups = self._record_backup(backup_info)
+            self._cleanup_old_backups(old_backups)
             
             logger.info(f"Backup created: {file_path} -> {backup_name}")
             return backup_info
@@ -93,12 +125,9 @@ class FileProtector:
     def restore_file(self, file_path: str, version_index: int = -1) -> bool:
         """استرجاع ملف من النسخة الاحتياطية"""
         try:
-            if file_path not in self.backup_registry:
-                logger.warning(f"No backups found for {file_path}")
-                return False
-            
-            backups = self.backup_registry[file_path]
+            backups = self.get_backup_info(file_path)
             if not backups:
+                logger.warning(f"No backups found for {file_path}")
                 return False
             
             backup_info = backups[version_index]
@@ -120,26 +149,30 @@ class FileProtector:
     
     def get_backup_info(self, file_path: str) -> List[dict]:
         """الحصول على معلومات النسخ الاحتياطية لملف"""
-        return self.backup_registry.get(file_path, [])
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT {_BACKUP_COLUMNS} FROM backups WHERE original_path = ? ORDER BY id",
+                (file_path,)
+            ).fetchall()
+        return [dict(row) for row in rows]
     
     def restore_all_files(self) -> Dict[str, bool]:
         """استرجاع جميع الملفات التي لها نسخ احتياطية"""
+        with self._db_lock:
+            file_paths = [row[0] for row in self._db.execute("SELECT DISTINCT original_path FROM backups")]
+        
         results = {}
-        for file_path in self.backup_registry.keys():
+        for file_path in file_paths:
             success = self.restore_file(file_path)
             results[file_path] = success
         return results
     
     def get_statistics(self) -> dict:
-        """الحصول على إحصائيات النسخ الاحتياطية"""
-        total_files = len(self.backup_registry)
-        total_backups = sum(len(backups) for backups in self.backup_registry.values())
-        total_size = 0
-        
-        for backups in self.backup_registry.values():
-            for backup in backups:
-                if os.path.exists(backup['backup_path']):
-                    total_size += os.path.getsize(backup['backup_path'])
+        """الحصول على إحصائيات النسخ الاحتياطية (من السجل بدون فحص الملفات)"""
+        with self._db_lock:
+            total_files, total_backups, total_size = self._db.execute(
+                "SELECT COUNT(DISTINCT original_path), COUNT(*), COALESCE(SUM(file_size), 0) FROM backups"
+            ).fetchone()
         
         return {
             "protected_files": total_files,
@@ -147,51 +180,125 @@ class FileProtector:
             "total_size_mb": round(total_size / (1024 * 1024), 2)
         }
     
-    def _calculate_hash(self, file_path: str) -> str:
-        """حساب SHA-256 hash للملف"""
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
+    def _copy_and_hash(self, src: str, dst: str) -> str:
+        """نسخ الملف وحساب SHA-256 في مرور واحد (قراءة واحدة للمصدر)"""
+        sha256_hash = _sha256()
+        buffer = bytearray(1024 * 1024)
+        view = memoryview(buffer)
+        
+        with open(src, "rb", buffering=0) as fi, open(dst, "wb") as fo:
+            while True:
+                n = fi.readinto(buffer)
+                if not n:
+                    break
+                chunk = view[:n]
+                sha256_hash.update(chunk)
+                fo.write(chunk)
+            
+            # لا حاجة لإبقاء الملفين في الـ page cache
+            if hasattr(os, "posix_fadvise"):
+                for f in (fi, fo):
+                    try:
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                    except OSError:
+                        pass
+        
+        shutil.copystat(src, dst)
         return sha256_hash.hexdigest()
     
-    def _cleanup_old_backups(self, file_path: str):
-        """حذف النسخ القديمة الزائدة"""
-        if file_path not in self.backup_registry:
-            return
-        
-        backups = self.backup_registry[file_path]
+    def _cleanup_old_backups(self, old_backups: List[str]):
+        """حذف ملفات النسخ القديمة الزائدة"""
+        for backup_path in old_backups:
+            try:
+                if os.path.exists(backup_path):
+                    os.remove(backup_path)
+            except Exception as e:
+                logger.error(f"Failed to remove old backup: {e}")
+    
+    def _open_registry(self) -> sqlite3.Connection:
+        """فتح قاعدة بيانات السجل (WAL) وإنشاء الجداول"""
+        conn = sqlite3.connect(self.registry_db, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_REGISTRY_SCHEMA)
+        return conn
+    
+    def _record_backup(self, backup_info: dict) -> List[str]:
+        """
+        إضافة النسخة وحذف الزائد عن max_versions في transaction واحدة.
+        يعيد مسارات النسخ القديمة التي يجب حذفها.
+        """
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    f"INSERT INTO backups ({_BACKUP_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                    (backup_info["original_path"], backup_info["backup_path"], backup_info["timestamp"],
+                     backup_info["file_hash"], backup_info["file_size"])
+                )
+                old_rows = self._db.execute(
+                    "SELECT id, backup_path FROM backups WHERE original_path = ? "
+                    "ORDER BY id DESC LIMIT -1 OFFSET ?",
+                    (backup_info["original_path"], self.max_versions)
+                ).fetchall()
+                if old_rows:
+                    self._db.executemany("DELETE FROM backups WHERE id = ?", [(row["id"],) for row in old_rows])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
         
-        if len(backups) > self.max_versions:
-            old_backups = backups[:-self.max_versions]
-            
-            for backup in old_backups:
-                try:
-                    if os.path.exists(backup["backup_path"]):
-                        os.remove(backup["backup_path"])
-                except Exception as e:
-                    logger.error(f"Failed to remove old backup: {e}")
-            
-            self.backup_registry[file_path] = backups[-self.max_versions:]
+        return [row["backup_path"] for row in old_rows]
     
     def _load_registry(self):
         """تحميل سجل النسخ الاحتياطية"""
-        registry_file = os.path.join(self.backup_dir, "backup_registry.json")
+        self._migrate_json_registry()
         
-        if os.path.exists(registry_file):
-            try:
-                with open(registry_file, 'r', encoding='utf-8') as f:
-                    self.backup_registry = json.load(f)
-                logger.info(f"Backup registry loaded: {len(self.backup_registry)} files")
-            except Exception as e:
-                logger.error(f"Failed to load backup registry: {e}")
+        with self._db_lock:
+            total_files = self._db.execute("SELECT COUNT(DISTINCT original_path) FROM backups").fetchone()[0]
+        
+        logger.info(f"Backup registry loaded: {total_files} files")
     
-    def _save_registry(self):
-        """حفظ سجل النسخ الاحتياطية"""
+    def _migrate_json_registry(self):
+        """ترحيل السجل القديم (backup_registry.json + journal) إلى SQLite مرة واحدة"""
         registry_file = os.path.join(self.backup_dir, "backup_registry.json")
+        journal_file = os.path.join(self.backup_dir, "backup_registry.jsonl")
+        if not any(os.path.exists(p) for p in (registry_file, journal_file)):
+            return
         
+        registry: Dict[str, List[dict]] = {}
         try:
-            with open(registry_file, 'w', encoding='utf-8') as f:
-                json.dump(self.backup_registry, f, indent=2, ensure_ascii=False)
+            if os.path.exists(registry_file):
+                with open(registry_file, 'rb') as f:
+                    registry = _loads(f.read())
+            
+            if os.path.exists(journal_file):
+                with open(journal_file, 'rb') as f:
+                    for line in f:
+                        try:
+                            backup_info = _loads(line)
+                        except ValueError:
+                            continue  # سطر فارغ أو غير مكتمل
+                        backups = registry.setdefault(backup_info["original_path"], [])
+                        if all(b["backup_path"] != backup_info["backup_path"] for b in backups):
+                            backups.append(backup_info)
+            
+            with self._db_lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    f"INSERT INTO backups ({_BACKUP_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                    [(b["original_path"], b["backup_path"], b["timestamp"], b["file_hash"], b["file_size"])
+                     for backups in registry.values() for b in backups]
+                )
+                self._db.execute("COMMIT")
         except Exception as e:
-            logger.error(f"Failed to save backup registry: {e}")
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            logger.error(f"Failed to migrate backup registry: {e}")
+            return
+        
+        for p in (registry_file, journal_file):
+            if os.path.exists(p):
+                os.replace(p, p + ".migrated")
+        logger.info(f"Backup registry migrated to SQLite: {len(registry)} files")
@@ -3,6 +3,28 @@ import os
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, timezone
 import json
+import hashlib
+import atexit
+import queue
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional C accelerator; stdlib json is used otherwise
+    orjson = None
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+
+def _dump_line(entry: dict) -> bytes:
+    """Serialize one incident as a JSONL line"""
+    if orjson:
+        return orjson.dumps(entry, default=str) + b'\n'
+    return (json.dumps(entry, default=str) + '\n').encode('utf-8')
 
 
 class RansomwareLogger:
@@ -39,20 +61,101 @@ class RansomwareLogger:
         self.logger.addHandler(file_handler)
         self.logger.addHandler(console_handler)
         
-        # Incident logger (JSON format)
+        # Incident logger (JSON format), written by a background thread
         self.incident_log_file = os.path.join(log_dir, 'incidents.jsonl')
+        self._incident_queue = queue.SimpleQueue()
+        self._writer_thread = threading.Thread(
+            target=self._incident_writer, name='IncidentWriter', daemon=True
+        )
+        self._writer_thread.start()
+        atexit.register(self.close)
+        
+        self._log_digest_backend()
+    
+    def _log_digest_backend(self):
+        """Log which library backs hashlib's SHA-256 and warn on slow setups"""
+        # OpenSSL-backed digests are _hashlib.HASH objects; the builtin fallback lives in _sha2/_sha256
+        backend = hashlib.sha256(usedforsecurity=False).__class__.__module__
+        if backend != '_hashlib':
+            self.logger.warning(f"SHA-256 backend: builtin {backend} (no OpenSSL); file hashing will be slow")
+            return
+        
+        # ssl is normally linked against the same OpenSSL; used only to report its version
+        self.logger.info(f"SHA-256 backend: {ssl.OPENSSL_VERSION if ssl else 'OpenSSL'}")
+        
+        # OpenSSL < 1.1.1 has no SHA-NI code path
+        if ssl is not None and ssl.OPENSSL_VERSION_INFO < (1, 1, 1):
+            self.logger.warning(
+                "OpenSSL older than 1.1.1 in use; SHA-256 hardware acceleration unavailable"
+            )
+        
+        # OPENSSL_ia32cap can mask CPU extensions such as SHA-NI
+        if os.environ.get('OPENSSL_ia32cap'):
+            self.logger.warning(
+                f"OPENSSL_ia32cap={os.environ['OPENSSL_ia32cap']} may disable SHA-NI acceleration"
+            )
         
     def log_incident(self, incident_data: dict):
-        """Log incident in JSON format for analysis"""
+        """Log incident in JSON format for analysis (queued; never blocks on disk)"""
+        self._incident_queue.put((time.time_ns(), incident_data))
+    
+    def _open_incident_log(self):
+        """Open the incident log for appending; kept open for the writer's lifetime"""
+        return open(self.incident_log_file, 'ab', buffering=1 << 16)
+    
+    def _incident_log_rotated(self, f) -> bool:
+        """True if incidents.jsonl was moved or deleted under the open handle"""
         try:
-            with open(self.incident_log_file, 'a', encoding='utf-8') as f:
-                incident_entry = {
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    **incident_data
-                }
-                f.write(json.dumps(incident_entry) + '\n')
-        except Exception as e:
-            self.logger.error(f"Failed to log incident: {e}")
+            return os.stat(self.incident_log_file).st_ino != os.fstat(f.fileno()).st_ino
+        except OSError:
+            return True
+    
+    def _incident_writer(self):
+        """Drain queued incidents and append them to the JSONL file in batches"""
+        f = self._open_incident_log()
+        try:
+            while True:
+                batch = [self._incident_queue.get()]
+                try:
+                    while True:
+                        batch.append(self._incident_queue.get_nowait())
+                except queue.Empty:
+                    pass
+                
+                stop = None in batch
+                lines = []
+                for item in batch:
+                    if item is None:
+                        continue
+                    ns, incident_data = item
+                    try:
+                        lines.append(_dump_line({
+                            'timestamp': datetime.fromtimestamp(ns / 1e9, timezone.utc).isoformat(),
+                            **incident_data
+                        }))
+                    except Exception as e:
+                        self.logger.error(f"Failed to log incident: {e}")
+                
+                try:
+                    # Reopen only when the file was rotated away
+                    if self._incident_log_rotated(f):
+                        f.close()
+                        f = self._open_incident_log()
+                    f.write(b''.join(lines))
+                    f.flush()
+                except Exception as e:
+                    self.logger.error(f"Failed to log incident: {e}")
+                
+                if stop:
+                    return
+        finally:
+            f.close()
+    
+    def close(self):
+        """Flush pending incidents and stop the writer thread"""
+        if self._writer_thread.is_alive():
+            self._incident_queue.put(None)
+            self._writer_thread.join(timeout=5)
     
     def log_file_event(self, event_type: str, file_path: str, details: dict = None):
         """Log file system event"""
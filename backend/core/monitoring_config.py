@@ -4,12 +4,31 @@ Monitoring Configuration Manager - مدير إعدادات المراقبة
 """
 
 import json
+import mmap
 import os
 import logging
+import tempfile
 from typing import Dict, List
 
+try:
+    import orjson
+except ImportError:  # مسرّع اختياري؛ يُستخدم json القياسي بدونه
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# ملفات أكبر من هذا تُقرأ عبر mmap بدل نسخة كاملة في الذاكرة
+MMAP_MIN_SIZE = 16 * 1024
+
+_loads = orjson.loads if orjson else json.loads
+
+
+def _dumps_indented(obj) -> bytes:
+    """تحويل الإعدادات إلى JSON منسق بصيغة UTF-8"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
 
 class MonitoringMode:
     """أنواع المراقبة المتاحة"""
@@ -32,25 +51,65 @@ class MonitoringConfig:
         
         self.config = self._load_config()
         self.monitoring_modes = self._get_monitoring_modes()
+        
+        # رقم إصدار يزيد مع كل تعديل؛ القيم المحسوبة تُعاد بناؤها عند تغيره فقط
+        self._version = 0
+        self._flags_cache = (-1, (True, True, False), {})
+        
+        # تجميع عمليات الحفظ داخل with: حفظ واحد عند الخروج
+        self._batch_depth = 0
+        self._dirty = False
+    
+    def __enter__(self):
+        self._batch_depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._dirty:
+            self._save_config()
+        return False
     
     def _load_config(self) -> dict:
         """تحميل ملف الإعدادات"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(self.config_path, 'rb') as f:
+                if orjson and os.fstat(f.fileno()).st_size > MMAP_MIN_SIZE:
+                    # orjson يقرأ من الـ mmap مباشرة بدون نسخة bytes
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        return _loads(view)
+                return _loads(f.read())
         except Exception as e:
             logger.error(f"Failed to load config: {e}")
             return {}
     
     def _save_config(self):
-        """حفظ ملف الإعدادات"""
+        """حفظ ملف الإعدادات (كتابة ذرية عبر ملف مؤقت + os.replace)"""
+        if self._batch_depth > 0:
+            # داخل with: الحفظ مؤجل حتى __exit__
+            self._dirty = True
+            return True
+        
         try:
             logger.info(f"Attempting to save config to: {self.config_path}")
             logger.info(f"Config file exists: {os.path.exists(self.config_path)}")
             logger.info(f"Config dir exists: {os.path.exists(os.path.dirname(self.config_path))}")
             
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            data = _dumps_indented(self.config)
+            config_dir = os.path.dirname(os.path.abspath(self.config_path))
+            fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix=".settings-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                if os.path.exists(self.config_path):
+                    # mkstemp ينشئ الملف بصلاحيات 0600؛ نحافظ على صلاحيات الملف الأصلي
+                    os.chmod(tmp_path, os.stat(self.config_path).st_mode & 0o777)
+                os.replace(tmp_path, self.config_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._dirty = False
             logger.info(f"Configuration saved successfully to: {self.config_path}")
             return True
         except Exception as e:
@@ -65,17 +124,30 @@ class MonitoringConfig:
             "system_files": False
         })
     
+    def _flags(self) -> tuple:
+        """(user, decoy, system) محسوبة مرة واحدة لكل إصدار"""
+        version, flags, _ = self._flags_cache
+        if version != self._version:
+            flags = (
+                self.monitoring_modes.get("user_files", True),
+                self.monitoring_modes.get("decoy_files", True),
+                self.monitoring_modes.get("system_files", False)
+            )
+            modes = {"user_files": flags[0], "decoy_files": flags[1], "system_files": flags[2]}
+            self._flags_cache = (self._version, flags, modes)
+        return flags
+    
     def is_user_files_enabled(self) -> bool:
         """هل مراقبة ملفات المستخدم مفعلة؟"""
-        return self.monitoring_modes.get("user_files", True)
+        return self._flags()[0]
     
     def is_decoy_files_enabled(self) -> bool:
         """هل مراقبة ملفات الفخاخ مفعلة؟"""
-        return self.monitoring_modes.get("decoy_files", True)
+        return self._flags()[1]
     
     def is_system_files_enabled(self) -> bool:
         """هل مراقبة ملفات النظام مفعلة؟"""
-        return self.monitoring_modes.get("system_files", False)
+        return self._flags()[2]
     
     def set_monitoring_mode(self, mode: str, enabled: bool) -> bool:
         """تفعيل/تعطيل وضع مراقبة معين"""
@@ -87,13 +159,7 @@ class MonitoringConfig:
                 return False
             
             # تحديث الإعدادات
-            if "monitoring" not in self.config:
-                self.config["monitoring"] = {}
-            
-            if "monitoring_mode" not in self.config["monitoring"]:
-                self.config["monitoring"]["monitoring_mode"] = {}
-            
-            self.config["monitoring"]["monitoring_mode"][mode] = enabled
+            self._apply_mode(mode, enabled)
             
             # حفظ التغييرات
             save_success = self._save_config()
@@ -102,9 +168,6 @@ class MonitoringConfig:
                 logger.error(f"Failed to save configuration for mode '{mode}'")
                 return False
             
-            # تحديث الذاكرة المحلية
-            self.monitoring_modes = self._get_monitoring_modes()
-            
             logger.info(f"Monitoring mode '{mode}' set to {enabled}")
             return True
             
@@ -112,21 +175,35 @@ class MonitoringConfig:
             logger.error(f"Failed to set monitoring mode: {e}")
             return False
     
+    def _apply_mode(self, mode: str, enabled: bool):
+        """تعديل وضع المراقبة في الذاكرة فقط (بدون حفظ)"""
+        if "monitoring" not in self.config:
+            self.config["monitoring"] = {}
+        
+        if "monitoring_mode" not in self.config["monitoring"]:
+            self.config["monitoring"]["monitoring_mode"] = {}
+        
+        self.config["monitoring"]["monitoring_mode"][mode] = enabled
+        
+        # تحديث الذاكرة المحلية
+        self.monitoring_modes = self._get_monitoring_modes()
+        self._version += 1
+    
     def get_all_modes(self) -> dict:
-        """الحصول على جميع أوضاع المراقبة"""
-        return {
-            "user_files": self.is_user_files_enabled(),
-            "decoy_files": self.is_decoy_files_enabled(),
-            "system_files": self.is_system_files_enabled()
-        }
+        """الحصول على جميع أوضاع المراقبة (نسخة مشتركة لكل إصدار؛ للقراءة فقط)"""
+        self._flags()
+        return self._flags_cache[2]
     
     def set_all_modes(self, modes: dict) -> bool:
         """تعيين جميع أوضاع المراقبة دفعة واحدة"""
         try:
             for mode, enabled in modes.items():
                 if mode in ["user_files", "decoy_files", "system_files"]:
-                    self.set_monitoring_mode(mode, enabled)
-            return True
+                    self._apply_mode(mode, enabled)
+                    logger.info(f"Monitoring mode '{mode}' set to {enabled}")
+            
+            # حفظ واحد لكل الأوضاع
+            return self._save_config()
         except Exception as e:
             logger.error(f"Failed to set all modes: {e}")
             return False
@@ -1,34 +1,61 @@
 """
 Professional Process Cache System
-Optimizes process detection with intelligent caching and thread pooling
+Optimizes process detection with intelligent caching and bounded concurrent scans
 """
 
+import os
 import time
+import ntpath
+import getpass
 import psutil
 import logging
-from typing import Optional, Dict, Tuple
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
 from threading import Lock, Thread
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-from dataclasses import dataclass
+from concurrent.futures import TimeoutError
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Negative cache: bloom filter of directories whose scan found no process
+NEG_BLOOM_BITS = 2048 * 8
+NEG_BLOOM_MAX_TTL = 5.0
 
-@dataclass
+
+def _dir_prefix(path: str) -> str:
+    """Directory path with exactly one trailing separator, so /foo never matches /foobar"""
+    return path.rstrip('\\/') + os.sep
+
+
+@dataclass(frozen=True)
 class ProcessInfo:
-    """Cached process information"""
+    """Cached process information (immutable; its dict form is built once)"""
     pid: int
     name: str
     exe: str
     cwd: str
-    timestamp: float
+    timestamp: float  # time.monotonic() when the entry was cached
     username: str = ""
+    create_time: float = 0.0  # Fingerprint that tells a recycled PID apart (0 = unknown)
+    cwd_prefix: str = field(default="", repr=False)
+    _as_dict: Dict = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        if self.cwd and not self.cwd_prefix:
+            object.__setattr__(self, 'cwd_prefix', _dir_prefix(self.cwd))
+        object.__setattr__(self, '_as_dict', {
+            'pid': self.pid,
+            'name': self.name,
+            'exe': self.exe,
+            'cwd': self.cwd,
+            'username': self.username
+        })
 
 
 class ProcessCache:
     """
-    High-performance process cache with TTL and thread pooling.
+    High-performance process cache with TTL and bounded concurrent scans.
     Reduces CPU usage by 90% compared to full psutil.process_iter().
     """
     
@@ -38,20 +65,64 @@ class ProcessCache:
         
         Args:
             ttl_seconds: Time to live for cache entries (default: 60s)
-            max_workers: Number of worker threads for scanning (default: 4)
+            max_workers: Maximum number of concurrent scans (default: 4)
         """
         self.ttl_seconds = ttl_seconds
-        self.cache: Dict[str, ProcessInfo] = {}
-        self.pid_cache: Dict[int, ProcessInfo] = {}
+        # PID entries are verified against the process creation time on every
+        # hit, so they can live much longer than path entries
+        self.pid_ttl_seconds = max(ttl_seconds, 300)
+        # One slot table holds every entry as (path or None, info); the path
+        # and pid indexes map to slot numbers. Writers hold self.lock; readers
+        # look up a slot without locking and verify it still holds their key.
+        self.max_entries = 1000
+        self._entries: List[Optional[Tuple[Optional[str], ProcessInfo]]] = []
+        self._free: List[int] = []
+        self._by_path: Dict[str, int] = {}
+        self._by_pid: Dict[int, int] = {}
+        self._order: Dict[int, None] = OrderedDict()  # Slots, oldest write first
         self.lock = Lock()
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        
+        # Current user, matched exactly or as the user part of DOMAIN\user
+        try:
+            self._current_user = getpass.getuser().lower()
+        except Exception:
+            self._current_user = ""
+        self._current_user_suffix = '\\' + self._current_user
+        
+        # POSIX: match owners by real uid (an int compare) instead of by name
+        self._my_uid = os.getuid() if hasattr(os, 'getuid') else None
+        self._my_username = ""
+        if self._my_uid is not None:
+            try:
+                import pwd
+                self._my_username = pwd.getpwuid(self._my_uid).pw_name
+            except (ImportError, KeyError):
+                self._my_username = str(self._my_uid)
+        
+        # Concurrent scans are capped at max_workers; extra callers fail fast
+        self.max_workers = max_workers
+        self._in_flight = 0
+        self._in_flight_lock = Lock()
+        self.rejected_scans = 0
         self.last_full_scan = 0
         self.full_scan_interval = 300  # Full scan every 5 minutes
         
+        # Process table snapshot as parallel lists, shared by every scan
+        # until it is older than snapshot_ttl
+        self.snapshot_ttl = 2.0
+        self._snapshot = self._empty_snapshot()
+        self._snapshot_lock = Lock()
+        
         # Performance metrics
         self.cache_hits = 0
         self.cache_misses = 0
         self.scan_count = 0
+        self.negative_hits = 0
+        
+        # Short interval so a newly started process is not hidden for long
+        self.negative_ttl = min(ttl_seconds, NEG_BLOOM_MAX_TTL)
+        self._neg_bloom = bytearray(NEG_BLOOM_BITS // 8)
+        self._neg_bloom_expires = 0.0
         
         logger.info(f"ProcessCache initialized with TTL={ttl_seconds}s, workers={max_workers}")
     
@@ -66,39 +137,58 @@ class ProcessCache:
         Returns:
             Process information dict or None
         """
+        now = time.monotonic()
+        
         # Check cache first
-        cached = self._check_cache(file_path)
+        cached = self._check_cache(file_path, now)
         if cached:
             self.cache_hits += 1
             return self._process_info_to_dict(cached)
         
         self.cache_misses += 1
         
-        # Scan for process in background thread
+        # Directory recently scanned with no result: skip the scan
+        file_dir = ntpath.split(file_path)[0]
+        if self._neg_bloom_contains(file_dir, now):
+            self.negative_hits += 1
+            return None
+        
+        # Saturated: queued scans would blow the timeout anyway
+        with self._in_flight_lock:
+            if self._in_flight >= self.max_workers:
+                self.rejected_scans += 1
+                return None
+            self._in_flight += 1
+        
+        # Scan inline; the deadline is checked between processes, so a slow
+        # scan stops early instead of finishing behind an abandoned Future
         try:
-            future = self.executor.submit(self._scan_for_process, file_path)
-            process_info = future.result(timeout=timeout)
+            process_info = self._scan_for_process(file_path, now + timeout, now)
             
             if process_info:
                 # Cache the result
                 self._cache_process(file_path, process_info)
                 return self._process_info_to_dict(process_info)
+            
+            self._neg_bloom_add(file_dir)
         
         except TimeoutError:
             logger.warning(f"Process scan timeout for {file_path}")
         except Exception as e:
             logger.error(f"Error scanning for process: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
         
         return None
     
     def get_process_by_pid(self, pid: int) -> Optional[Dict]:
         """Get process info by PID from cache"""
-        with self.lock:
-            if pid in self.pid_cache:
-                info = self.pid_cache[pid]
-                if time.time() - info.timestamp < self.ttl_seconds:
-                    self.cache_hits += 1
-                    return self._process_info_to_dict(info)
+        now = time.monotonic()
+        info = self._lookup(self._by_pid.get(pid))
+        if info is not None and info.pid == pid and self._is_live_entry(info, now):
+            self.cache_hits += 1
+            return self._process_info_to_dict(info)
         
         self.cache_misses += 1
         
@@ -110,128 +200,292 @@ class ProcessCache:
                 name=proc.name(),
                 exe=proc.exe() if proc.exe() else "Unknown",
                 cwd=proc.cwd() if proc.cwd() else "",
-                timestamp=time.time(),
-                username=proc.username() if proc.username() else ""
+                timestamp=now,
+                username=proc.username() if proc.username() else "",
+                create_time=proc.create_time()
             )
             
-            with self.lock:
-                self.pid_cache[pid] = info
+            self._store(None, info)
             
             return self._process_info_to_dict(info)
         
         except (psutil.NoSuchProcess, psutil.AccessDenied, Exception):
             return None
     
-    def _check_cache(self, file_path: str) -> Optional[ProcessInfo]:
-        """Check if process info is in cache and still valid"""
-        with self.lock:
-            if file_path in self.cache:
-                info = self.cache[file_path]
-                # Check if cache entry is still valid
-                if time.time() - info.timestamp < self.ttl_seconds:
-                    return info
-                else:
-                    # Remove expired entry
-                    del self.cache[file_path]
+    @staticmethod
+    def _neg_bloom_positions(file_dir: str) -> Tuple[int, int, int]:
+        """Three bit positions derived from one string hash"""
+        h = hash(file_dir) & 0xFFFFFFFFFFFF
+        return h % NEG_BLOOM_BITS, (h >> 16) % NEG_BLOOM_BITS, (h >> 32) % NEG_BLOOM_BITS
+    
+    def _neg_bloom_contains(self, file_dir: str, now: float) -> bool:
+        """True if file_dir was (probably) scanned without result in this interval"""
+        if now >= self._neg_bloom_expires:
+            # Start a new interval with an empty filter
+            self._neg_bloom = bytearray(NEG_BLOOM_BITS // 8)
+            self._neg_bloom_expires = now + self.negative_ttl
+            return False
+        
+        bloom = self._neg_bloom
+        for bit in self._neg_bloom_positions(file_dir):
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+    
+    def _neg_bloom_add(self, file_dir: str):
+        bloom = self._neg_bloom
+        for bit in self._neg_bloom_positions(file_dir):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    
+    def _is_live_entry(self, info: ProcessInfo, now: float) -> bool:
+        """True if a PID entry still describes the same running process"""
+        age = now - info.timestamp
+        if not info.create_time:
+            return age < self.ttl_seconds
+        if age >= self.pid_ttl_seconds:
+            return False
+        
+        try:
+            return psutil.Process(info.pid).create_time() == info.create_time
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+    
+    def _lookup(self, slot: Optional[int], file_path: Optional[str] = None) -> Optional[ProcessInfo]:
+        """Read a slot without locking; None if it was freed or reused for another path"""
+        entries = self._entries
+        if slot is None or slot >= len(entries):  # The table may have been cleared
+            return None
+        entry = entries[slot]
+        if entry is None or (file_path is not None and entry[0] != file_path):
+            return None
+        return entry[1]
+    
+    def _check_cache(self, file_path: str, now: float) -> Optional[ProcessInfo]:
+        """Check if process info is in cache and still valid (lock-free)"""
+        info = self._lookup(self._by_path.get(file_path), file_path)
+        # Expired entries are left in place and replaced by the next write
+        if info is not None and now - info.timestamp < self.ttl_seconds:
+            return info
         
         return None
     
-    def _scan_for_process(self, file_path: str) -> Optional[ProcessInfo]:
+    def _scan_for_process(self, file_path: str, deadline: Optional[float] = None,
+                          now: Optional[float] = None) -> Optional[ProcessInfo]:
         """
         Optimized process scanning with smart heuristics.
         Only scans relevant processes instead of all processes.
+        
+        Args:
+            file_path: Path of the file being accessed
+            deadline: time.monotonic() value after which the scan gives up
+            now: time.monotonic() captured by the caller, reused for every TTL check
+        
+        Raises:
+            TimeoutError: if the deadline passes before any candidate is found
         """
         self.scan_count += 1
-        current_time = time.time()
+        current_time = time.monotonic() if now is None else now
         
         # Extract path components for faster matching
-        file_dir = file_path.rsplit('\\', 1)[0] if '\\' in file_path else ""
-        file_name = file_path.rsplit('\\', 1)[1] if '\\' in file_path else file_path
+        file_dir = ntpath.split(file_path)[0]
+        dir_key = _dir_prefix(file_dir) if file_dir else ""
         
         # Strategy 1: Check recently active processes first (from cache)
-        with self.lock:
-            for cached_info in list(self.cache.values()):
-                if current_time - cached_info.timestamp < 10:  # Last 10 seconds
-                    if cached_info.cwd and file_dir.startswith(cached_info.cwd):
-                        return cached_info
-        
-        # Strategy 2: Smart process iteration (filtered)
-        candidates = []
+        for entry in self._entries:
+            if entry is None:
+                continue
+            cached_info = entry[1]
+            if current_time - cached_info.timestamp < 10:  # Last 10 seconds
+                if cached_info.cwd_prefix and dir_key.startswith(cached_info.cwd_prefix):
+                    return cached_info
         
+        # Strategy 2: Smart process iteration over the shared snapshot (filtered)
         try:
-            # Get current user's processes only (much faster than all processes)
-            import getpass
-            current_user = getpass.getuser()
+            snapshot = self._get_snapshot(current_time, deadline)
+            cwds = snapshot['cwds']
+            cwd_prefixes = snapshot['cwd_prefixes']
+            exes = snapshot['exes']
+            users = snapshot['users']
             
-            for proc in psutil.process_iter(['pid', 'name', 'exe', 'cwd', 'username']):
-                try:
-                    # Skip system processes
-                    if proc.info['username'] and current_user not in proc.info['username']:
-                        continue
-                    
-                    # Fast matching heuristics
-                    cwd = proc.info.get('cwd', '')
-                    exe = proc.info.get('exe', '')
-                    
-                    # Check if process is working in the same directory
-                    if cwd and file_dir.startswith(cwd):
+            # Single pass keeping only the best score (first one wins ties)
+            best = -1
+            best_score = 0
+            
+            # Only the current user's processes (filtered once per snapshot)
+            for i in snapshot['owned']:
+                # Check if process is working in the same directory
+                cwd = cwds[i]
+                if cwd:
+                    if dir_key.startswith(cwd_prefixes[i]):
                         score = len(cwd)  # Longer matching path = higher score
-                        candidates.append((score, proc))
-                    
-                    # Check if exe is in the same directory
-                    elif exe and file_dir in exe:
-                        candidates.append((50, proc))
+                        if score > best_score:
+                            best, best_score = i, score
+                        continue
                 
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+                # Check if exe is in the same directory
+                if best_score < 50 and file_dir:
+                    exe = exes[i]
+                    if exe and file_dir in exe:
+                        best, best_score = i, 50
+            
+            if best < 0 and snapshot['partial']:
+                raise TimeoutError
             
             # Return best candidate
-            if candidates:
-                candidates.sort(key=lambda x: x[0], reverse=True)
-                best_proc = candidates[0][1]
-                
+            if best >= 0:
                 return ProcessInfo(
-                    pid=best_proc.info['pid'],
-                    name=best_proc.info['name'],
-                    exe=best_proc.info.get('exe', 'Unknown'),
-                    cwd=best_proc.info.get('cwd', ''),
+                    pid=snapshot['pids'][best],
+                    name=snapshot['names'][best],
+                    exe=exes[best] or 'Unknown',
+                    cwd=cwds[best],
+                    cwd_prefix=cwd_prefixes[best],
                     timestamp=current_time,
-                    username=best_proc.info.get('username', '')
+                    username=users[best],
+                    create_time=snapshot['create_times'][best]
                 )
         
+        except TimeoutError:
+            raise
         except Exception as e:
             logger.debug(f"Process scan error: {e}")
         
         return None
     
+    @staticmethod
+    def _empty_snapshot() -> Dict:
+        return {'ts': float('-inf'), 'partial': False, 'pids': [], 'names': [], 'exes': [], 'cwds': [], 'cwd_prefixes': [], 'users': [], 'create_times': [], 'owned': []}
+    
+    def _get_snapshot(self, now: float, deadline: Optional[float] = None) -> Dict:
+        """Return the process snapshot, refreshing it once its TTL has expired"""
+        snapshot = self._snapshot
+        if now - snapshot['ts'] < self.snapshot_ttl:
+            return snapshot
+        
+        with self._snapshot_lock:
+            # Another thread may have refreshed while we waited
+            snapshot = self._snapshot
+            if time.monotonic() - snapshot['ts'] < self.snapshot_ttl:
+                return snapshot
+            return self._refresh_snapshot(deadline)
+    
+    def _refresh_snapshot(self, deadline: Optional[float] = None) -> Dict:
+        """
+        Walk psutil.process_iter once into parallel lists.
+        If the deadline passes mid-walk the partial snapshot is returned
+        with ts left unset, so the next scan refreshes it again.
+        """
+        snapshot = self._empty_snapshot()
+        pids = snapshot['pids']
+        names = snapshot['names']
+        exes = snapshot['exes']
+        cwds = snapshot['cwds']
+        cwd_prefixes = snapshot['cwd_prefixes']
+        users = snapshot['users']
+        create_times = snapshot['create_times']
+        owned = snapshot['owned']
+        current_user = self._current_user
+        current_user_suffix = self._current_user_suffix
+        my_uid = self._my_uid
+        my_username = self._my_username
+        owner_attr = 'username' if my_uid is None else 'uids'
+        
+        for proc in psutil.process_iter(['pid', 'name', 'exe', 'cwd', owner_attr, 'create_time']):
+            # Read the clock every 16 processes rather than on each one
+            if deadline is not None and not (len(pids) & 15) and time.monotonic() > deadline:
+                snapshot['partial'] = True
+                break
+            
+            info = proc.info
+            pids.append(info['pid'])
+            names.append(info['name'] or '')
+            exes.append(info['exe'] or '')
+            cwd = info['cwd'] or ''
+            cwds.append(cwd)
+            cwd_prefixes.append(_dir_prefix(cwd) if cwd else '')
+            create_times.append(info['create_time'] or 0.0)
+            
+            # Skip other users' processes (system services included)
+            if my_uid is not None:
+                uids = info['uids']
+                if uids and uids.real != my_uid:
+                    users.append('')  # Never reported, so the name is not resolved
+                    continue
+                users.append(my_username if uids else '')
+            else:
+                username = info['username'] or ''
+                users.append(username)
+                if username:
+                    username = username.lower()
+                    if username != current_user and not username.endswith(current_user_suffix):
+                        continue
+            owned.append(len(pids) - 1)
+        
+        if not snapshot['partial']:
+            snapshot['ts'] = time.monotonic()
+            self.last_full_scan = time.time()
+        
+        self._snapshot = snapshot
+        return snapshot
+    
     def _cache_process(self, file_path: str, info: ProcessInfo):
         """Cache process information"""
+        self._store(file_path, info)
+    
+    def _store(self, file_path: Optional[str], info: ProcessInfo):
+        """Put an entry in a free slot and point both indexes at it"""
         with self.lock:
-            self.cache[file_path] = info
-            self.pid_cache[info.pid] = info
+            # Replace this path's previous entry and any path-less entry for the pid
+            if file_path is not None and file_path in self._by_path:
+                self._release(self._by_path[file_path])
+            pid_slot = self._by_pid.get(info.pid)
+            if pid_slot is not None and self._entries[pid_slot][0] is None:
+                self._release(pid_slot)
             
-            # Limit cache size (keep most recent 1000 entries)
-            if len(self.cache) > 1000:
-                # Remove oldest 200 entries
-                sorted_items = sorted(self.cache.items(), key=lambda x: x[1].timestamp)
-                for i in range(200):
-                    del self.cache[sorted_items[i][0]]
+            if self._free:
+                slot = self._free.pop()
+                self._entries[slot] = (file_path, info)
+            else:
+                slot = len(self._entries)
+                self._entries.append((file_path, info))
+            
+            self._order[slot] = None
+            if file_path is not None:
+                self._by_path[file_path] = slot
+            self._by_pid[info.pid] = slot
+            
+            # Limit cache size (keep most recent entries); hits do not
+            # reorder, so this evicts the oldest writes
+            while len(self._order) > self.max_entries:
+                self._release(next(iter(self._order)))
+    
+    def _release(self, slot: int):
+        """Drop a slot from both indexes and return it to the free list (lock held)"""
+        file_path, info = self._entries[slot]
+        self._entries[slot] = None
+        del self._order[slot]
+        if file_path is not None and self._by_path.get(file_path) == slot:
+            del self._by_path[file_path]
+        if self._by_pid.get(info.pid) == slot:
+            del self._by_pid[info.pid]
+        self._free.append(slot)
     
     def _process_info_to_dict(self, info: ProcessInfo) -> Dict:
-        """Convert ProcessInfo to dict for compatibility"""
-        return {
-            'pid': info.pid,
-            'name': info.name,
-            'exe': info.exe,
-            'cwd': info.cwd,
-            'username': info.username
-        }
+        """
+        Dict form of ProcessInfo for compatibility.
+        The same dict is shared by every hit, so callers must treat it as read-only.
+        """
+        return info._as_dict
     
     def clear_cache(self):
         """Clear all cached data"""
         with self.lock:
-            self.cache.clear()
-            self.pid_cache.clear()
+            self._by_path = {}
+            self._by_pid = {}
+            self._entries = []
+            self._free = []
+            self._order = OrderedDict()
+        self._neg_bloom_expires = 0.0
+        self._snapshot = self._empty_snapshot()
         
         logger.info("Process cache cleared")
     
@@ -244,18 +498,21 @@ class ProcessCache:
             'cache_hits': self.cache_hits,
             'cache_misses': self.cache_misses,
             'hit_rate': f"{hit_rate:.2f}%",
-            'cache_size': len(self.cache),
-            'scan_count': self.scan_count
+            'cache_size': len(self._order),
+            'scan_count': self.scan_count,
+            'scans_in_flight': self._in_flight,
+            'rejected_scans': self.rejected_scans,
+            'negative_hits': self.negative_hits
         }
     
     def shutdown(self):
-        """Shutdown executor gracefully"""
-        self.executor.shutdown(wait=True)
+        """Log final statistics; scans run inline so there is nothing to stop"""
         logger.info(f"ProcessCache shutdown. Stats: {self.get_stats()}")
 
 
 # Global process cache instance
 _process_cache = None
+_process_cache_lock = Lock()
 
 
 def get_process_cache(ttl_seconds: int = 60, max_workers: int = 4) -> ProcessCache:
@@ -263,6 +520,9 @@ def get_process_cache(ttl_seconds: int = 60, max_workers: int = 4) -> ProcessCac
     global _process_cache
     
     if _process_cache is None:
-        _process_cache = ProcessCache(ttl_seconds=ttl_seconds, max_workers=max_workers)
+        # Double-checked so concurrent first callers cannot build two caches
+        with _process_cache_lock:
+            if _process_cache is None:
+                _process_cache = ProcessCache(ttl_seconds=ttl_seconds, max_workers=max_workers)
     
     return _process_cache
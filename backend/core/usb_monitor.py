@@ -4,13 +4,26 @@ USB Drive Monitor - مراقب الأقراص الخارجية
 """
 
 import os
+import time
+import ctypes
 import string
 import logging
-from typing import List
+from typing import List, Set, Tuple
 import psutil
 
 logger = logging.getLogger(__name__)
 
+# مدة الاحتفاظ بقائمة الأقراص (نادراً ما تتغير)
+DRIVES_CACHE_TTL = 2.0
+
+# أقراص النظام المستثناة من المراقبة
+_SYSTEM_DRIVES = frozenset({'C:\\'})
+
+try:
+    _GetLogicalDrives = ctypes.windll.kernel32.GetLogicalDrives
+except (AttributeError, OSError):
+    _GetLogicalDrives = None  # ليس Windows
+
 
 class USBDriveMonitor:
     """مراقبة الأقراص الخارجية USB وحمايتها"""
@@ -18,64 +31,75 @@ class USBDriveMonitor:
     def __init__(self):
         self.monitored_drives: List[str] = []
         self.drive_info: dict = {}
+        self._drives: Tuple[List[str], List[str], List[str]] = ([], [], [])
+        self._drives_ts = float('-inf')
+        self._known_removable: Set[str] = set()
     
-    def get_all_drives(self) -> List[str]:
-        """الحصول على جميع الأقراص المتصلة"""
-        drives = []
-        
-        # Windows: فحص جميع الحروف A-Z
-        for letter in string.ascii_uppercase:
-            drive = f"{letter}:\\"
-            if os.path.exists(drive):
-                drives.append(drive)
+    def _scan_drives(self) -> Tuple[List[str], List[str], List[str]]:
+        """
+        فحص واحد للأقراص: (كل الأقراص، القابلة للإزالة، الشبكية)
+        يستدعي psutil.disk_partitions() مرة واحدة فقط ويحتفظ بالنتيجة لمدة DRIVES_CACHE_TTL
+        """
+        now = time.monotonic()
+        if now - self._drives_ts < DRIVES_CACHE_TTL:
+            return self._drives
         
-        return drives
-    
-    def get_removable_drives(self) -> List[str]:
-        """الحصول على الأقراص القابلة للإزالة فقط (USB)"""
         removable_drives = []
+        network_drives = []
         
         try:
-            partitions = psutil.disk_partitions()
-            for partition in partitions:
+            for partition in psutil.disk_partitions(all=False):
+                opts = partition.opts.lower()
                 # التحقق من نوع القرص
-                if 'removable' in partition.opts.lower():
+                if 'removable' in opts:
                     removable_drives.append(partition.mountpoint)
-                    logger.info(f"USB drive detected: {partition.mountpoint}")
+                if partition.fstype == 'nfs' or 'remote' in opts:
+                    network_drives.append(partition.mountpoint)
         except Exception as e:
-            logger.error(f"Failed to detect removable drives: {e}")
+            logger.error(f"Failed to detect drives: {e}")
+        
+        if _GetLogicalDrives is not None:
+            # Windows: استدعاء واحد يعيد قناع بت لجميع الحروف A-Z
+            # ثم os.path.exists لتجاهل قارئات البطاقات ومحركات الأقراص الضوئية الفارغة
+            mask = _GetLogicalDrives()
+            all_drives = [
+                drive for drive in (f"{letter}:\\" for i, letter in enumerate(string.ascii_uppercase) if mask & (1 << i))
+                if os.path.exists(drive)
+            ]
+        else:
+            # غير Windows: لا توجد حروف أقراص، كما في السابق
+            all_drives = []
+        
+        # تسجيل الأقراص USB الجديدة فقط بدلاً من كل استعلام
+        for drive in removable_drives:
+            if drive not in self._known_removable:
+                logger.info(f"USB drive detected: {drive}")
+        self._known_removable = set(removable_drives)
         
-        return removable_drives
+        self._drives = (all_drives, removable_drives, network_drives)
+        self._drives_ts = now
+        return self._drives
+    
+    def get_all_drives(self) -> List[str]:
+        """الحصول على جميع الأقراص المتصلة"""
+        return list(self._scan_drives()[0])
+    
+    def get_removable_drives(self) -> List[str]:
+        """الحصول على الأقراص القابلة للإزالة فقط (USB)"""
+        return list(self._scan_drives()[1])
     
     def get_network_drives(self) -> List[str]:
         """الحصول على الأقراص الشبكية"""
-        network_drives = []
-        
-        try:
-            partitions = psutil.disk_partitions()
-            for partition in partitions:
-                if partition.fstype == 'nfs' or 'remote' in partition.opts.lower():
-                    network_drives.append(partition.mountpoint)
-        except Exception as e:
-            logger.error(f"Failed to detect network drives: {e}")
-        
-        return network_drives
+        return list(self._scan_drives()[2])
     
     def should_monitor_drive(self, drive_path: str) -> bool:
         """تحديد ما إذا كان يجب مراقبة القرص"""
-        # استثناء أقراص النظام
-        system_drives = ['C:\\']
-        
-        if drive_path in system_drives:
-            return False
-        
-        # مراقبة جميع الأقراص الأخرى
-        return True
+        # استثناء أقراص النظام، ومراقبة جميع الأقراص الأخرى
+        return drive_path not in _SYSTEM_DRIVES
     
     def get_drives_to_monitor(self) -> List[str]:
         """الحصول على قائمة الأقراص التي يجب مراقبتها"""
-        all_drives = self.get_all_drives()
-        removable = self.get_removable_drives()
+        all_drives, removable, _ = self._scan_drives()
         
         drives_to_monitor = []
         
@@ -93,8 +117,7 @@ class USBDriveMonitor:
     
     def get_drive_statistics(self) -> dict:
         """إحصائيات الأقراص"""
-        all_drives = self.get_all_drives()
-        removable = self.get_removable_drives()
+        all_drives, removable, _ = self._scan_drives()
         
         return {
             "total_drives": len(all_drives),
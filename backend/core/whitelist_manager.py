@@ -3,15 +3,58 @@ Professional Whitelist Manager
 Reduces false positives by maintaining a list of trusted processes
 """
 
+import atexit
 import logging
 import json
+import mmap
 import os
+import re
+import threading
+import time
+from functools import lru_cache
 from typing import List, Dict, Optional, Set
 from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # Optional accelerator; falls back to the stdlib json module
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+_loads = orjson.loads if orjson else json.loads
+
+
+def _dumps(obj) -> bytes:
+    """Serialize the whitelist to compact UTF-8 JSON"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+# Changes are written at most this long after the first unsaved mutation
+SAVE_DELAY_SECONDS = 5.0
+
+# Whitelist files larger than this are parsed straight from an mmap
+MMAP_MIN_SIZE = 16 * 1024
+
+# Critical system folders for folder-based whitelisting (lowercase, normalized)
+SYSTEM_FOLDERS = (
+    'c:\\windows\\system32\\',
+    'c:\\windows\\syswow64\\',
+    'c:\\windows\\winsxs\\',
+)
+
+# Trusted install locations for auto-detection, matched in one pass over the
+# lowercased exe path ('program files' also covers 'program files (x86)')
+_COMMON_PATHS_RE = re.compile(r'program files|microsoft|google|mozilla')
+
+
+@lru_cache(maxsize=4096)
+def _normalize_path(path: str) -> str:
+    """Normalized lowercase form of an executable path (memoized; scanners repeat paths)"""
+    return os.path.normpath(path).lower()
+
 
 class WhitelistManager:
     """
@@ -84,13 +127,25 @@ class WhitelistManager:
         self.whitelist_file = whitelist_file or "data/whitelist.json"
         self.whitelist: Dict[str, Dict] = {}
         self.whitelist_paths: Set[str] = set()  # Full executable paths
+        self._name_set: frozenset = frozenset()  # Lowercase names, rebuilt on every change
+        self._wl_version = 0  # Bumped on every change; part of the _check_path cache key
+        
+        self._ts_cache = (float('-inf'), "")  # (monotonic time, ISO string)
+        
+        # Debounced persistence: mutations mark dirty and arm one timer
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        atexit.register(self.flush)
         
         # Performance metrics
+        self._stats_cache = (float('-inf'), None)  # (monotonic time, stats dict)
         self.checks_performed = 0
         self.whitelist_hits = 0
         
         # Load whitelist
         self._load_whitelist()
+        self._rebuild_name_set()
         
         logger.info(f"WhitelistManager initialized with {len(self.whitelist)} entries")
     
@@ -98,17 +153,23 @@ class WhitelistManager:
         """Load whitelist from file or use defaults"""
         try:
             if os.path.exists(self.whitelist_file):
-                with open(self.whitelist_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(self.whitelist_file, 'rb') as f:
+                    if orjson and os.fstat(f.fileno()).st_size > MMAP_MIN_SIZE:
+                        # orjson parses the mapped pages without an intermediate bytes copy
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                            data = _loads(view)
+                    else:
+                        data = _loads(f.read())
                     self.whitelist = data.get('processes', {})
-                    self.whitelist_paths = set(data.get('paths', []))
+                    self.whitelist_paths = {_normalize_path(p) for p in data.get('paths', [])}
                 logger.info(f"Loaded whitelist from {self.whitelist_file}")
             else:
                 # Use defaults
+                added_date = self._now_iso()
                 self.whitelist = {
                     name: {
                         'description': desc,
-                        'added_date': datetime.now(timezone.utc).isoformat(),
+                        'added_date': added_date,
                         'auto_detected': True
                     }
                     for name, desc in self.DEFAULT_WHITELIST.items()
@@ -124,25 +185,67 @@ class WhitelistManager:
                 for name, desc in self.DEFAULT_WHITELIST.items()
             }
     
-    def _save_whitelist(self):
+    def _now_iso(self) -> str:
+        """Current UTC time as ISO string, reused for up to one second"""
+        now = time.monotonic()
+        cached_at, iso = self._ts_cache
+        if now - cached_at >= 1.0:
+            iso = datetime.now(timezone.utc).isoformat()
+            self._ts_cache = (now, iso)
+        return iso
+    
+    def _rebuild_name_set(self):
+        """Refresh the frozenset used by the is_whitelisted fast path (called on every change)"""
+        self._wl_version += 1
+        names = self.whitelist.keys()
+        # Untouched defaults share the module-level set instead of a copy
+        self._name_set = DEFAULT_WHITELIST_NAMES if names == DEFAULT_WHITELIST_NAMES else frozenset(names)
+    
+    def _schedule_save(self):
+        """Mark the whitelist dirty and arm the save timer if it is not already running"""
+        self._dirty = True
+        with self._timer_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self._on_save_timer)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+    
+    def _on_save_timer(self):
+        with self._timer_lock:
+            self._save_timer = None
+        self.flush()
+    
+    def flush(self):
+        """Write pending whitelist changes to disk now"""
+        if self._dirty:
+            self._dirty = False
+            if not self._save_whitelist():
+                self._dirty = True
+    
+    def _save_whitelist(self) -> bool:
         """Save whitelist to file"""
         try:
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.whitelist_file), exist_ok=True)
             
+            # Shallow copies so a concurrent add/remove cannot change the
+            # containers while they are being serialized
             data = {
-                'processes': self.whitelist,
+                'processes': dict(self.whitelist),
                 'paths': list(self.whitelist_paths),
-                'last_updated': datetime.now(timezone.utc).isoformat()
+                'last_updated': self._now_iso()
             }
             
-            with open(self.whitelist_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            payload = _dumps(data)
+            with open(self.whitelist_file, 'wb') as f:
+                f.write(payload)
             
             logger.debug(f"Whitelist saved to {self.whitelist_file}")
+            return True
         
         except Exception as e:
             logger.error(f"Failed to save whitelist: {e}")
+            return False
     
     def is_whitelisted(self, process_name: str = None, process_path: str = None) -> bool:
         """
@@ -157,42 +260,38 @@ class WhitelistManager:
         """
         self.checks_performed += 1
         
-        # Check by process name
-        if process_name:
-            process_name_lower = process_name.lower()
-            if process_name_lower in self.whitelist:
-                self.whitelist_hits += 1
-                logger.debug(f"Process whitelisted by name: {process_name}")
-                return True
+        # Check by process name (the common case; no path work needed)
+        process_name_lower = process_name.lower() if process_name else None
+        if process_name_lower in self._name_set:
+            self.whitelist_hits += 1
+            logger.debug(f"Process whitelisted by name: {process_name}")
+            return True
         
-        # Check by full path
-        if process_path:
-            process_path_normalized = os.path.normpath(process_path).lower()
-
-            # Check direct path whitelist
-            if process_path_normalized in self.whitelist_paths:
-                self.whitelist_hits += 1
-                logger.debug(f"Path whitelisted directly: {process_path}")
-                return True
-
-            # Smart folder-based whitelisting for critical system folders
-            # Requires process to be in a known safe system folder AND be a known system process
-            system_folders = [
-                'c:\\windows\\system32\\',
-                'c:\\windows\\syswow64\\',
-                'c:\\windows\\winsxs\\'
-            ]
-
-            if any(process_path_normalized.startswith(folder) for folder in system_folders):
-                # Only trust if it's also a known system process name to prevent
-                # ransomware from running out of system folders (rare but possible)
-                if process_name and process_name.lower() in self.whitelist:
-                    self.whitelist_hits += 1
-                    logger.debug(f"Process whitelisted by system path + name: {process_path}")
-                    return True
+        # Check by full path (memoized until the whitelist changes)
+        if process_path and _check_path(process_name_lower, process_path, self._wl_version, self):
+            self.whitelist_hits += 1
+            return True
 
         return False
     
+    def filter_whitelisted(self, process_names: List[str]) -> List[bool]:
+        """
+        Check many process names at once (name-only, like the is_whitelisted fast path).
+        
+        Args:
+            process_names: Process names, e.g. from one pass over the process table
+        
+        Returns:
+            One bool per name, in the same order
+        """
+        name_set = self._name_set
+        results = [bool(name) and name.lower() in name_set for name in process_names]
+        
+        hits = sum(results)
+        self.checks_performed += len(results)
+        self.whitelist_hits += hits
+        return results
+    
     def add_to_whitelist(self, process_name: str, description: str = "", 
                         process_path: str = None, auto_detected: bool = False) -> bool:
         """
@@ -212,14 +311,15 @@ class WhitelistManager:
             
             self.whitelist[process_name_lower] = {
                 'description': description or process_name,
-                'added_date': datetime.now(timezone.utc).isoformat(),
+                'added_date': self._now_iso(),
                 'auto_detected': auto_detected
             }
             
             if process_path:
-                self.whitelist_paths.add(os.path.normpath(process_path).lower())
+                self.whitelist_paths.add(_normalize_path(process_path))
             
-            self._save_whitelist()
+            self._rebuild_name_set()
+            self._schedule_save()
             logger.info(f"Added to whitelist: {process_name}")
             return True
         
@@ -249,13 +349,14 @@ class WhitelistManager:
                     removed = True
             
             if process_path:
-                process_path_normalized = os.path.normpath(process_path).lower()
+                process_path_normalized = _normalize_path(process_path)
                 if process_path_normalized in self.whitelist_paths:
                     self.whitelist_paths.remove(process_path_normalized)
                     removed = True
             
             if removed:
-                self._save_whitelist()
+                self._rebuild_name_set()
+                self._schedule_save()
                 logger.info(f"Removed from whitelist: {process_name or process_path}")
                 return True
             
@@ -289,15 +390,21 @@ class WhitelistManager:
             self.whitelist.clear()
         
         self.whitelist_paths.clear()
-        self._save_whitelist()
+        self._rebuild_name_set()
+        self._schedule_save()
         logger.info("Whitelist cleared")
     
     def get_stats(self) -> Dict:
-        """Get whitelist statistics"""
+        """Get whitelist statistics (recomputed at most once per second)"""
+        now = time.monotonic()
+        cached_at, stats = self._stats_cache
+        if now - cached_at < 1.0:
+            return stats
+        
         hit_rate = (self.whitelist_hits / self.checks_performed * 100) \
                    if self.checks_performed > 0 else 0
         
-        return {
+        stats = {
             'total_entries': len(self.whitelist) + len(self.whitelist_paths),
             'process_entries': len(self.whitelist),
             'path_entries': len(self.whitelist_paths),
@@ -305,6 +412,8 @@ class WhitelistManager:
             'whitelist_hits': self.whitelist_hits,
             'hit_rate': f"{hit_rate:.2f}%"
         }
+        self._stats_cache = (now, stats)
+        return stats
     
     def auto_detect_and_add(self, process_info: Dict) -> bool:
         """
@@ -319,17 +428,8 @@ class WhitelistManager:
         process_name = process_info.get('name', '').lower()
         process_exe = process_info.get('exe', '').lower()
         
-        # Check if it's a known legitimate software
-        common_paths = [
-            'program files',
-            'program files (x86)',
-            'microsoft',
-            'google',
-            'mozilla',
-        ]
-        
-        # If executable is in a trusted location
-        if any(path in process_exe for path in common_paths):
+        # If executable is in a trusted location (known legitimate software)
+        if _COMMON_PATHS_RE.search(process_exe):
             # Check if not already whitelisted
             if not self.is_whitelisted(process_name):
                 self.add_to_whitelist(
@@ -343,6 +443,36 @@ class WhitelistManager:
         return False
 
 
+@lru_cache(maxsize=2048)
+def _check_path(process_name_lower: Optional[str], process_path: str,
+                wl_version: int, manager: WhitelistManager) -> bool:
+    """
+    Path part of WhitelistManager.is_whitelisted, memoized per whitelist version.
+    Counters stay in the caller so cached answers are still counted.
+    """
+    process_path_normalized = _normalize_path(process_path)
+
+    # Check direct path whitelist
+    if process_path_normalized in manager.whitelist_paths:
+        logger.debug(f"Path whitelisted directly: {process_path}")
+        return True
+
+    # Smart folder-based whitelisting for critical system folders
+    # Requires process to be in a known safe system folder AND be a known system process
+    if process_path_normalized.startswith(SYSTEM_FOLDERS):
+        # Only trust if it's also a known system process name to prevent
+        # ransomware from running out of system folders (rare but possible)
+        if process_name_lower in manager._name_set:
+            logger.debug(f"Process whitelisted by system path + name: {process_path}")
+            return True
+
+    return False
+
+
+# Names of the default trusted processes, computed once at import
+DEFAULT_WHITELIST_NAMES = frozenset(WhitelistManager.DEFAULT_WHITELIST)
+
+
 # Global instance
 _whitelist_manager = None
 
@@ -0,0 +1,280 @@
+"""
+Native Windows File Watcher
+Direct ReadDirectoryChangesW wrapper with a large notification buffer
+"""
+
+import ctypes
+import logging
+import os
+import struct
+import threading
+from ctypes import wintypes
+from typing import List
+
+from watchdog.events import (
+    DirCreatedEvent, DirModifiedEvent, DirMovedEvent,
+    FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent
+)
+
+logger = logging.getLogger(__name__)
+
+# watchdog's emitter uses a 64 KB buffer; bursts of thousands of renames
+# overflow it and the kernel then drops the whole batch.
+BUFFER_SIZE = 1024 * 1024
+NETWORK_BUFFER_SIZE = 64 * 1024  # ReadDirectoryChangesW limit for UNC shares
+
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x00000001 | 0x00000002 | 0x00000004  # read | write | delete
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FILE_FLAG_OVERLAPPED = 0x40000000
+INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+ERROR_OPERATION_ABORTED = 995
+ERROR_NOTIFY_ENUM_DIR = 1022  # Overlapped reads report buffer overflow this way
+INFINITE = 0xFFFFFFFF
+WAIT_OBJECT_0 = 0
+
+NOTIFY_FILTER = (
+    0x00000001  # FILE_NOTIFY_CHANGE_FILE_NAME
+    | 0x00000002  # FILE_NOTIFY_CHANGE_DIR_NAME
+    | 0x00000004  # FILE_NOTIFY_CHANGE_ATTRIBUTES
+    | 0x00000008  # FILE_NOTIFY_CHANGE_SIZE
+    | 0x00000010  # FILE_NOTIFY_CHANGE_LAST_WRITE
+    | 0x00000040  # FILE_NOTIFY_CHANGE_CREATION
+    | 0x00000100  # FILE_NOTIFY_CHANGE_SECURITY
+)
+
+FILE_ACTION_ADDED = 1
+FILE_ACTION_REMOVED = 2
+FILE_ACTION_MODIFIED = 3
+FILE_ACTION_RENAMED_OLD_NAME = 4
+FILE_ACTION_RENAMED_NEW_NAME = 5
+
+_NOTIFY_HEADER = struct.Struct('<III')  # NextEntryOffset, Action, FileNameLength
+
+
+class _OVERLAPPED(ctypes.Structure):
+    _fields_ = [
+        ('Internal', ctypes.c_void_p),
+        ('InternalHigh', ctypes.c_void_p),
+        ('Offset', wintypes.DWORD),
+        ('OffsetHigh', wintypes.DWORD),
+        ('hEvent', wintypes.HANDLE),
+    ]
+
+
+def _load_kernel32():
+    """Bind the kernel32 functions used by the watcher (None off Windows)"""
+    try:
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    except (AttributeError, OSError):
+        return None
+
+    kernel32.CreateFileW.argtypes = [
+        wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.c_void_p,
+        wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE
+    ]
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    kernel32.ReadDirectoryChangesW.argtypes = [
+        wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD, wintypes.BOOL,
+        wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), ctypes.POINTER(_OVERLAPPED), ctypes.c_void_p
+    ]
+    kernel32.ReadDirectoryChangesW.restype = wintypes.BOOL
+    kernel32.GetOverlappedResult.argtypes = [
+        wintypes.HANDLE, ctypes.POINTER(_OVERLAPPED), ctypes.POINTER(wintypes.DWORD), wintypes.BOOL
+    ]
+    kernel32.GetOverlappedResult.restype = wintypes.BOOL
+    kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, ctypes.POINTER(_OVERLAPPED)]
+    kernel32.CancelIoEx.restype = wintypes.BOOL
+    kernel32.CreateEventW.argtypes = [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+    kernel32.CreateEventW.restype = wintypes.HANDLE
+    kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+    kernel32.SetEvent.restype = wintypes.BOOL
+    kernel32.ResetEvent.argtypes = [wintypes.HANDLE]
+    kernel32.ResetEvent.restype = wintypes.BOOL
+    kernel32.WaitForMultipleObjects.argtypes = [
+        wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.BOOL, wintypes.DWORD
+    ]
+    kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    kernel32.CloseHandle.restype = wintypes.BOOL
+    return kernel32
+
+
+_kernel32 = _load_kernel32()
+
+
+def is_supported() -> bool:
+    """True when the native watcher can run on this platform"""
+    return _kernel32 is not None
+
+
+def parse_notifications(buffer, size: int) -> List[tuple]:
+    """
+    Parse a FILE_NOTIFY_INFORMATION chain into (action, relative_path) pairs.
+    The whole chain is walked in one tight loop before any handler runs.
+    """
+    records = []
+    offset = 0
+    while offset < size:
+        next_offset, action, name_length = _NOTIFY_HEADER.unpack_from(buffer, offset)
+        start = offset + _NOTIFY_HEADER.size
+        name = bytes(buffer[start:start + name_length]).decode('utf-16-le')
+        records.append((action, name))
+        if not next_offset:
+            break
+        offset += next_offset
+    return records
+
+
+class _DirectoryWatch(threading.Thread):
+    """
+    Overlapped ReadDirectoryChangesW loop for one directory (GIL released while waiting).
+    Each read waits on its completion event and a stop event together, so stop()
+    wakes the thread whether or not a read is pending.
+    """
+
+    def __init__(self, event_handler, path: str, recursive: bool):
+        super().__init__(name=f"NativeWatch:{path}", daemon=True)
+        self.event_handler = event_handler
+        self.path = os.path.abspath(path)
+        self.recursive = recursive
+        self.buffer_size = NETWORK_BUFFER_SIZE if self.path.startswith('\\\\') else BUFFER_SIZE
+        self._stopped = threading.Event()
+        self._stop_lock = threading.Lock()  # Guards _stop_event against close in run()
+        self._stop_event = None
+        # Old name of a rename whose new name has not arrived yet; the pair
+        # can be split across two notification buffers
+        self._rename_from = None
+
+    def run(self):
+        with self._stop_lock:
+            if self._stopped.is_set():
+                return
+            self._stop_event = _kernel32.CreateEventW(None, True, False, None)
+        read_event = _kernel32.CreateEventW(None, True, False, None)
+
+        handle = _kernel32.CreateFileW(
+            self.path, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None,
+            OPEN_EXISTING, FILE_FLAG_BACKUP_SEMANTICS | FILE_FLAG_OVERLAPPED, None
+        )
+        try:
+            if handle == INVALID_HANDLE_VALUE:
+                logger.error(f"Native watcher could not open {self.path}: error {ctypes.get_last_error()}")
+                return
+            try:
+                self._read_loop(handle, read_event)
+            finally:
+                _kernel32.CloseHandle(handle)
+        finally:
+            with self._stop_lock:
+                _kernel32.CloseHandle(self._stop_event)
+                self._stop_event = None
+            _kernel32.CloseHandle(read_event)
+
+    def _read_loop(self, handle, read_event):
+        buffer = ctypes.create_string_buffer(self.buffer_size)
+        view = memoryview(buffer)
+        bytes_returned = wintypes.DWORD()
+        overlapped = _OVERLAPPED()
+        overlapped.hEvent = read_event
+        wait_handles = (wintypes.HANDLE * 2)(read_event, self._stop_event)
+
+        while not self._stopped.is_set():
+            _kernel32.ResetEvent(read_event)
+            ok = _kernel32.ReadDirectoryChangesW(
+                handle, buffer, self.buffer_size, self.recursive,
+                NOTIFY_FILTER, None, ctypes.byref(overlapped), None
+            )
+            if not ok:
+                logger.error(f"ReadDirectoryChangesW failed for {self.path}: error {ctypes.get_last_error()}")
+                return
+
+            if _kernel32.WaitForMultipleObjects(2, wait_handles, False, INFINITE) != WAIT_OBJECT_0:
+                # Stop requested: cancel the pending read and wait for it to
+                # finish before the buffer and OVERLAPPED go out of scope
+                _kernel32.CancelIoEx(handle, ctypes.byref(overlapped))
+                _kernel32.GetOverlappedResult(handle, ctypes.byref(overlapped), ctypes.byref(bytes_returned), True)
+                return
+
+            if not _kernel32.GetOverlappedResult(handle, ctypes.byref(overlapped), ctypes.byref(bytes_returned), False):
+                error = ctypes.get_last_error()
+                if error == ERROR_NOTIFY_ENUM_DIR:
+                    logger.warning(f"Change buffer overflow for {self.path}; some events were lost")
+                    continue
+                if error != ERROR_OPERATION_ABORTED:
+                    logger.error(f"ReadDirectoryChangesW failed for {self.path}: error {error}")
+                return
+
+            if bytes_returned.value == 0:
+                logger.warning(f"Change buffer overflow for {self.path}; some events were lost")
+                continue
+
+            self._dispatch(parse_notifications(view, bytes_returned.value))
+
+    def _dispatch(self, records: List[tuple]):
+        """Turn raw notifications into watchdog events for the handler"""
+        for action, name in records:
+            full_path = os.path.join(self.path, name)
+
+            if action == FILE_ACTION_RENAMED_OLD_NAME:
+                self._rename_from = full_path
+                continue
+
+            if action == FILE_ACTION_RENAMED_NEW_NAME:
+                event_cls = DirMovedEvent if os.path.isdir(full_path) else FileMovedEvent
+                event = event_cls(self._rename_from or full_path, full_path)
+                self._rename_from = None
+            elif action == FILE_ACTION_ADDED:
+                event = DirCreatedEvent(full_path) if os.path.isdir(full_path) else FileCreatedEvent(full_path)
+            elif action == FILE_ACTION_MODIFIED:
+                event = DirModifiedEvent(full_path) if os.path.isdir(full_path) else FileModifiedEvent(full_path)
+            elif action == FILE_ACTION_REMOVED:
+                # The path no longer exists, so it cannot be classified
+                event = FileDeletedEvent(full_path)
+            else:
+                continue
+
+            try:
+                self.event_handler.dispatch(event)
+            except Exception as e:
+                logger.error(f"Native watcher handler error: {e}")
+
+    def stop(self):
+        with self._stop_lock:
+            self._stopped.set()
+            if self._stop_event is not None:
+                # Wake run() whether or not a read is pending
+                _kernel32.SetEvent(self._stop_event)
+
+
+class NativeObserver:
+    """
+    Observer with the same schedule/start/stop/join surface as
+    watchdog.observers.Observer, backed by _DirectoryWatch threads.
+    """
+
+    def __init__(self):
+        self._watches: List[_DirectoryWatch] = []
+
+    def schedule(self, event_handler, path: str, recursive: bool = False):
+        watch = _DirectoryWatch(event_handler, path, recursive)
+        self._watches.append(watch)
+        return watch
+
+    def start(self):
+        for watch in self._watches:
+            if not watch.is_alive():
+                watch.start()
+
+    def stop(self):
+        for watch in self._watches:
+            watch.stop()
+
+    def join(self, timeout: float = None):
+        for watch in self._watches:
+            if watch.is_alive():
+                watch.join(timeout)
+
+    def is_alive(self) -> bool:
+        return any(watch.is_alive() for watch in self._watches)
@@ -4,14 +4,45 @@ Eliminates "database is locked" errors through queue-based batch inserts
 """
 
 import time
+import asyncio
+import inspect
 import logging
-from typing import List, Dict, Any
-from threading import Thread, Lock
-from queue import Queue, Empty
+import sqlite3
+import sys
+from typing import List, Dict, Any, Optional
+from threading import Thread, Lock, Event
+from queue import Queue, Empty, Full
 from datetime import datetime, timezone
 
+from sqlalchemy.exc import OperationalError
+
 logger = logging.getLogger(__name__)
 
+# Upper bound per queue; producers drop (and count) items beyond it
+MAX_QUEUE_SIZE = 10000
+
+# Low-cardinality string columns; interned so queued rows share one object per value
+ALERT_INTERN_FIELDS = ('alert_type', 'severity')
+EVENT_INTERN_FIELDS = ('event_type', 'process_name', 'threat_level')
+INCIDENT_INTERN_FIELDS = ('status', 'severity', 'process_name')
+
+# First retry delay in seconds; doubles on each further attempt
+RETRY_BASE_DELAY = 0.01
+
+
+def _intern_fields(data: Dict, fields: tuple) -> Dict:
+    """Replace the given string values in data with their interned copies"""
+    for field in fields:
+        value = data.get(field)
+        if type(value) is str:
+            data[field] = sys.intern(value)
+    return data
+
+
+def _is_database_locked(error: Exception) -> bool:
+    """True for SQLite BUSY errors, which busy_timeout has already waited out"""
+    return isinstance(error, (OperationalError, sqlite3.OperationalError)) and 'locked' in str(error)
+
 
 class BatchWriter:
     """
@@ -19,7 +50,8 @@ class BatchWriter:
     Queues database writes and flushes them in batches to eliminate locks.
     """
     
-    def __init__(self, database, batch_size: int = 100, flush_interval: float = 5.0):
+    def __init__(self, database, batch_size: int = 100, flush_interval: float = 5.0,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
         """
         Initialize batch writer.
         
@@ -27,153 +59,116 @@ class BatchWriter:
             database: Database instance
             batch_size: Number of items to batch before auto-flush (default: 100)
             flush_interval: Seconds between auto-flushes (default: 5.0)
+            loop: Event loop that owns the database engine (optional); without
+                  it the flush thread runs the async inserts on its own loop
         """
         self.database = database
+        self.loop = loop
+        self._thread_loop: Optional[asyncio.AbstractEventLoop] = None
         self.batch_size = batch_size
         self.flush_interval = flush_interval
         
-        # Separate queues for different data types
-        self.alerts_queue: List[Dict] = []
-        self.events_queue: List[Dict] = []
-        self.incidents_queue: List[Dict] = []
+        # Separate queues for different data types; Queue does its own
+        # locking, so producers never wait on a flush in progress
+        self.alerts_queue: Queue = Queue(maxsize=MAX_QUEUE_SIZE)
+        self.events_queue: Queue = Queue(maxsize=MAX_QUEUE_SIZE)
+        self.incidents_queue: Queue = Queue(maxsize=MAX_QUEUE_SIZE)
         
-        # Thread safety
+        # Guards the metric counters only
         self.lock = Lock()
         
-        # Auto-flush management
-        self.last_flush = time.time()
-        self.running = True
-        self.flush_thread = Thread(target=self._auto_flush_loop, daemon=True)
-        self.flush_thread.start()
-        
         # Performance metrics
+        self._stats_cache = (float('-inf'), None)  # (monotonic time, stats dict)
         self.total_queued = 0
         self.total_flushed = 0
         self.flush_count = 0
+        self.total_dropped = 0
+        
+        # Auto-flush management: the thread sleeps until a queue fills up,
+        # flush_interval passes, or shutdown wakes it
+        self.last_flush = time.time()
+        self.running = True
+        self._flush_event = Event()
+        self.flush_thread = Thread(target=self._auto_flush_loop, daemon=True)
+        self.flush_thread.start()
         
         logger.info(f"BatchWriter initialized (batch_size={batch_size}, flush_interval={flush_interval}s)")
     
     def add_alert(self, alert_data: Dict):
         """Add alert to batch queue"""
-        with self.lock:
-            self.alerts_queue.append(alert_data)
-            self.total_queued += 1
-            
-            # Auto-flush if batch size reached
-            if len(self.alerts_queue) >= self.batch_size:
-                self._flush_alerts()
+        # Wake the flush thread if batch size reached
+        if self._enqueue(self.alerts_queue, _intern_fields(alert_data, ALERT_INTERN_FIELDS)):
+            self._flush_event.set()
     
     def add_event(self, event_data: Dict):
         """Add event to batch queue"""
-        with self.lock:
-            self.events_queue.append(event_data)
-            self.total_queued += 1
-            
-            if len(self.events_queue) >= self.batch_size:
-                self._flush_events()
+        if self._enqueue(self.events_queue, _intern_fields(event_data, EVENT_INTERN_FIELDS)):
+            self._flush_event.set()
     
     def add_incident(self, incident_data: Dict):
         """Add incident to batch queue"""
-        with self.lock:
-            self.incidents_queue.append(incident_data)
-            self.total_queued += 1
-            
-            if len(self.incidents_queue) >= self.batch_size:
-                self._flush_incidents()
+        if self._enqueue(self.incidents_queue, _intern_fields(incident_data, INCIDENT_INTERN_FIELDS)):
+            self._flush_event.set()
     
-    def _flush_alerts(self):
-        """Flush alerts queue to database"""
-        if not self.alerts_queue:
-            return
-        
+    def _enqueue(self, queue: Queue, item: Dict) -> bool:
+        """Queue an item without blocking; True once the queue holds a full batch"""
         try:
-            batch = self.alerts_queue.copy()
-            count = len(batch)
-            
-            # Batch insert with retry
-            success = self._batch_insert_with_retry('alerts', batch)
-            
-            if success:
-                self.alerts_queue.clear()
-                self.total_flushed += count
-                self.flush_count += 1
-                logger.debug(f"Flushed {count} alerts to database")
-            else:
-                logger.error(f"Failed to flush {count} alerts after retries")
+            queue.put_nowait(item)
+        except Full:
+            with self.lock:
+                self.total_dropped += 1
+            logger.warning("Batch queue full, dropping item")
+            return False
         
-        except Exception as e:
-            logger.error(f"Error flushing alerts: {e}")
+        with self.lock:
+            self.total_queued += 1
+        return queue.qsize() >= self.batch_size
     
-    def _flush_events(self):
-        """Flush events queue to database"""
-        if not self.events_queue:
-            return
-        
-        try:
-            batch = self.events_queue.copy()
-            count = len(batch)
-            
-            success = self._batch_insert_with_retry('events', batch)
-            
-            if success:
-                self.events_queue.clear()
-                self.total_flushed += count
-                self.flush_count += 1
-                logger.debug(f"Flushed {count} events to database")
-            else:
-                logger.error(f"Failed to flush {count} events after retries")
-        
-        except Exception as e:
-            logger.error(f"Error flushing events: {e}")
+    def _drain(self, queue: Queue) -> List[Dict]:
+        """Take up to batch_size items off a queue without blocking"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+            except Empty:
+                break
+        return batch
     
-    def _flush_incidents(self):
-        """Flush incidents queue to database"""
-        if not self.incidents_queue:
-            return
-        
-        try:
-            batch = self.incidents_queue.copy()
-            count = len(batch)
-            
-            success = self._batch_insert_with_retry('incidents', batch)
-            
-            if success:
-                self.incidents_queue.clear()
-                self.total_flushed += count
-                self.flush_count += 1
-                logger.debug(f"Flushed {count} incidents to database")
-            else:
-                logger.error(f"Failed to flush {count} incidents after retries")
-        
-        except Exception as e:
-            logger.error(f"Error flushing incidents: {e}")
+    def _requeue(self, queue: Queue, batch: List[Dict]):
+        """Put a failed batch back for the next flush (as far as it fits)"""
+        for item in batch:
+            try:
+                queue.put_nowait(item)
+            except Full:
+                with self.lock:
+                    self.total_dropped += 1
     
-    def _batch_insert_with_retry(self, table_name: str, items: List[Dict], max_retries: int = 3) -> bool:
+    def _batch_insert_with_retry(self, insert, *args, max_retries: int = 3) -> Optional[bool]:
         """
         Batch insert with retry logic.
         
         Args:
-            table_name: Name of the table
-            items: List of items to insert
+            insert: Database method to call (e.g. database.batch_insert_mixed)
+            *args: Row lists passed to insert
             max_retries: Maximum retry attempts
         
         Returns:
-            True if successful, False otherwise
+            True if successful, False if the rows were rejected,
+            None if the database was locked (try again on the next flush)
         """
         for attempt in range(max_retries):
             try:
-                if table_name == 'alerts':
-                    self.database.batch_insert_alerts(items)
-                elif table_name == 'events':
-                    self.database.batch_insert_events(items)
-                elif table_name == 'incidents':
-                    self.database.batch_insert_incidents(items)
-                
+                self._run(insert(*args))
                 return True
             
             except Exception as e:
+                if _is_database_locked(e):
+                    # SQLite already retried for busy_timeout; the batch is
+                    # requeued for the next flush instead of sleeping here
+                    logger.warning(f"Batch insert skipped, database is locked: {e}")
+                    return None
                 if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 0.5  # Exponential backoff
+                    wait_time = RETRY_BASE_DELAY * (2 ** attempt)  # Exponential backoff
                     logger.warning(f"Batch insert failed (attempt {attempt + 1}/{max_retries}), retrying in {wait_time}s: {e}")
                     time.sleep(wait_time)
                 else:
@@ -182,54 +177,160 @@ class BatchWriter:
         
         return False
     
+    def _flush_table(self, table_name: str, insert, queue: Queue, rows: List[Dict]) -> Optional[int]:
+        """
+        Insert one table's rows on their own after a mixed transaction failed.
+        Rows the database rejects are dropped and logged so they cannot block
+        the queues; returns the number inserted, or None if the database was
+        locked (the remaining rows are requeued).
+        """
+        result = self._batch_insert_with_retry(insert, rows)
+        if result:
+            return len(rows)
+        if result is None:
+            self._requeue(queue, rows)
+            return None
+        
+        # The batch holds at least one bad row: isolate it row by row
+        inserted = 0
+        for i, row in enumerate(rows):
+            result = self._batch_insert_with_retry(insert, [row], max_retries=1)
+            if result is None:
+                self._requeue(queue, rows[i:])
+                return None
+            if result:
+                inserted += 1
+            else:
+                with self.lock:
+                    self.total_dropped += 1
+                logger.error(f"Dropping {table_name} row rejected by the database: {row}")
+        return inserted
+    
+    def _run(self, result):
+        """Wait for a database call; async methods run on the owning loop or this thread's loop"""
+        if not inspect.isawaitable(result):
+            return result
+        if self.loop is not None and self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(result, self.loop).result()
+        if self._thread_loop is None:
+            self._thread_loop = asyncio.new_event_loop()
+        return self._thread_loop.run_until_complete(result)
+    
     def _auto_flush_loop(self):
-        """Background thread for auto-flushing based on time"""
+        """
+        Background thread for auto-flushing based on batch size or time.
+        This is the only thread that writes to the database; producers just queue.
+        """
         while self.running:
             try:
-                time.sleep(1)  # Check every second
+                self._flush_event.wait(self.flush_interval)
+                self._flush_event.clear()
                 
-                current_time = time.time()
-                if current_time - self.last_flush >= self.flush_interval:
-                    self.flush_all()
-                    self.last_flush = current_time
+                self.flush_all()
+                self.last_flush = time.time()
             
             except Exception as e:
                 logger.error(f"Error in auto-flush loop: {e}")
+        
+        # Final flush after shutdown() woke us
+        try:
+            self.flush_all()
+        except Exception as e:
+            logger.error(f"Error in final flush: {e}")
+        
+        if self._thread_loop is not None:
+            self._thread_loop.close()
+            self._thread_loop = None
     
     def flush_all(self):
-        """Flush all queues immediately"""
-        with self.lock:
-            self._flush_alerts()
-            self._flush_events()
-            self._flush_incidents()
+        """Flush all queues immediately, one transaction per round of batches"""
+        while True:
+            alerts = self._drain(self.alerts_queue)
+            events = self._drain(self.events_queue)
+            incidents = self._drain(self.incidents_queue)
+            count = len(alerts) + len(events) + len(incidents)
+            if not count:
+                break
+            
+            result = self._batch_insert_with_retry(self.database.batch_insert_mixed, alerts, events, incidents)
+            
+            if result is None:
+                logger.error(f"Failed to flush {count} items, database is locked")
+                self._requeue(self.alerts_queue, alerts)
+                self._requeue(self.events_queue, events)
+                self._requeue(self.incidents_queue, incidents)
+                return
+            
+            if not result:
+                # One bad row fails the whole transaction; retry each table on
+                # its own so the other tables (and the good rows) still get written
+                count = 0
+                locked = False
+                for table_name, insert, queue, rows in (
+                    ('alerts', self.database.batch_insert_alerts, self.alerts_queue, alerts),
+                    ('events', self.database.batch_insert_events, self.events_queue, events),
+                    ('incidents', self.database.batch_insert_incidents, self.incidents_queue, incidents),
+                ):
+                    if not rows:
+                        continue
+                    if locked:
+                        self._requeue(queue, rows)
+                        continue
+                    inserted = self._flush_table(table_name, insert, queue, rows)
+                    if inserted is None:
+                        locked = True
+                    else:
+                        count += inserted
+                
+                if locked:
+                    with self.lock:
+                        self.total_flushed += count
+                    return
+            
+            with self.lock:
+                self.total_flushed += count
+                self.flush_count += 1
         
         logger.debug("All queues flushed")
     
     def get_stats(self) -> Dict:
-        """Get batch writer statistics"""
+        """Get batch writer statistics (recomputed at most once per second)"""
+        now = time.monotonic()
+        cached_at, stats = self._stats_cache
+        if now - cached_at < 1.0:
+            return stats
+        
         with self.lock:
-            return {
+            stats = {
                 'total_queued': self.total_queued,
                 'total_flushed': self.total_flushed,
                 'flush_count': self.flush_count,
-                'pending_alerts': len(self.alerts_queue),
-                'pending_events': len(self.events_queue),
-                'pending_incidents': len(self.incidents_queue),
+                'dropped': self.total_dropped,
+                'pending_alerts': self.alerts_queue.qsize(),
+                'pending_events': self.events_queue.qsize(),
+                'pending_incidents': self.incidents_queue.qsize(),
                 'flush_rate': f"{self.total_flushed / self.flush_count:.1f} items/flush" if self.flush_count > 0 else "N/A"
             }
+        self._stats_cache = (now, stats)
+        return stats
     
     def shutdown(self):
-        """Graceful shutdown - flush all pending items"""
+        """
+        Graceful shutdown - flush all pending items.
+        With a loop given, call this off that loop (e.g. asyncio.to_thread),
+        since the final flush runs on it.
+        """
         logger.info("BatchWriter shutting down...")
         self.running = False
+        self._flush_event.set()  # Wake the flush thread immediately
         
-        # Final flush
-        self.flush_all()
-        
-        # Wait for flush thread
+        # Wait for flush thread (it performs the final flush)
         if self.flush_thread.is_alive():
             self.flush_thread.join(timeout=5)
+        else:
+            self.flush_all()
         
+        self._stats_cache = (float('-inf'), None)  # Report final, not cached, numbers
         stats = self.get_stats()
         logger.info(f"BatchWriter shutdown complete. Final stats: {stats}")
 
@@ -238,7 +339,8 @@ class BatchWriter:
 _batch_writer = None
 
 
-def get_batch_writer(database=None, batch_size: int = 100, flush_interval: float = 5.0):
+def get_batch_writer(database=None, batch_size: int = 100, flush_interval: float = 5.0,
+                     loop: Optional[asyncio.AbstractEventLoop] = None):
     """Get or create global batch writer instance"""
     global _batch_writer
     
@@ -246,7 +348,8 @@ def get_batch_writer(database=None, batch_size: int = 100, flush_interval: float
         _batch_writer = BatchWriter(
             database=database,
             batch_size=batch_size,
-            flush_interval=flush_interval
+            flush_interval=flush_interval,
+            loop=loop
         )
     
     return _batch_writer
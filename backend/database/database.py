@@ -1,9 +1,31 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
-from .models import Base
+from sqlalchemy import event, text, insert
+from .models import Base, Alert, FileEvent, Incident
 import os
 
+# Indexes replaced by partial ones in models.py; dropped from databases created before the change
+OBSOLETE_INDEXES = (
+    "idx_file_events_timestamp_suspicious",
+    "ix_file_events_suspicious",
+    "idx_incidents_status_severity",
+    "ix_incidents_start_time",
+)
+
+
+def _sync_indexes(connection):
+    """
+    Bring the indexes of an existing database in line with the models.
+    create_all skips tables that already exist, so new indexes are created here
+    and the ones they replace are dropped.
+    """
+    for name in OBSOLETE_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 class Database:
     def __init__(self, db_path: str = "data/ransomware_defense.db"):
         # Create data directory if it doesn't exist
@@ -21,6 +43,18 @@ class Database:
             }
         )
         
+        # Per-connection pragmas must be set on every pooled connection,
+        # not just the one init_db happens to use
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA cache_size=-64000")  # 64MB cache
+            cursor.execute("PRAGMA busy_timeout=60000")  # 60 second timeout
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA mmap_size=268435456")  # 256MB memory-mapped reads
+            cursor.close()
+        
         # Session factory
         self.async_session = async_sessionmaker(
             self.engine,
@@ -31,13 +65,11 @@ class Database:
     async def init_db(self):
         """Initialize database tables"""
         async with self.engine.begin() as conn:
-            # Enable WAL mode for better concurrent access
+            # Enable WAL mode for better concurrent access (persists in the file)
             await conn.execute(text("PRAGMA journal_mode=WAL"))
-            await conn.execute(text("PRAGMA synchronous=NORMAL"))
-            await conn.execute(text("PRAGMA cache_size=-64000"))  # 64MB cache
-            await conn.execute(text("PRAGMA busy_timeout=60000"))  # 60 second timeout
             
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_sync_indexes)
     
     async def get_session(self) -> AsyncSession:
         """Get database session"""
@@ -54,10 +86,8 @@ class Database:
         
         async with self.async_session() as session:
             try:
-                from .models import Alert
-                
-                # Use bulk_insert_mappings for performance
-                session.add_all([Alert(**alert_data) for alert_data in alerts_list])
+                # One executemany INSERT; no ORM objects or unit-of-work flush
+                await session.execute(insert(Alert), alerts_list)
                 await session.commit()
                 
             except Exception as e:
@@ -71,9 +101,7 @@ class Database:
         
         async with self.async_session() as session:
             try:
-                from .models import Event
-                
-                session.add_all([Event(**event_data) for event_data in events_list])
+                await session.execute(insert(FileEvent), events_list)
                 await session.commit()
                 
             except Exception as e:
@@ -87,9 +115,29 @@ class Database:
         
         async with self.async_session() as session:
             try:
-                from .models import Incident
+                await session.execute(insert(Incident), incidents_list)
+                await session.commit()
                 
-                session.add_all([Incident(**incident_data) for incident_data in incidents_list])
+            except Exception as e:
+                await session.rollback()
+                raise e
+    
+    async def batch_insert_mixed(self, alerts_list: list, events_list: list, incidents_list: list):
+        """
+        Insert alerts, events and incidents in one transaction.
+        One commit means one WAL sync for the whole flush cycle.
+        """
+        if not (alerts_list or events_list or incidents_list):
+            return
+        
+        async with self.async_session() as session:
+            try:
+                if alerts_list:
+                    await session.execute(insert(Alert), alerts_list)
+                if events_list:
+                    await session.execute(insert(FileEvent), events_list)
+                if incidents_list:
+                    await session.execute(insert(Incident), incidents_list)
                 await session.commit()
                 
             except Exception as e:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
 
@@ -18,12 +18,14 @@ class FileEvent(Base):
     is_decoy = Column(Boolean, default=False)
     process_name = Column(String(255))
     process_id = Column(Integer)
-    suspicious = Column(Boolean, default=False, index=True)
+    suspicious = Column(Boolean, default=False)
     threat_level = Column(String(20))  # low, medium, high, critical
     
     # Composite indexes for faster queries
     __table_args__ = (
-        Index('idx_file_events_timestamp_suspicious', 'timestamp', 'suspicious'),
+        # Partial index: only the rare suspicious rows are indexed, benign inserts skip it
+        Index('idx_file_events_suspicious_partial', 'timestamp',
+              postgresql_where=text("suspicious = true"), sqlite_where=text("suspicious = 1")),
         Index('idx_file_events_process', 'process_name', 'process_id'),
         Index('idx_file_events_threat_level', 'threat_level'),
     )
@@ -54,7 +56,7 @@ class Incident(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     incident_id = Column(String(36), unique=True, index=True)
-    start_time = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    start_time = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Indexed by idx_incidents_time_range
     end_time = Column(DateTime, nullable=True)
     status = Column(String(20))  # active, contained, resolved, false_positive
     severity = Column(String(20))  # low, medium, high, critical
@@ -70,7 +72,11 @@ class Incident(Base):
     
     # Composite indexes for faster incident queries
     __table_args__ = (
-        Index('idx_incidents_status_severity', 'status', 'severity'),
+        # Partial index over live incidents only; resolved/false_positive rows never enter it
+        Index('idx_incidents_live', 'severity', 'start_time',
+              postgresql_where=text("status IN ('active', 'contained')"),
+              sqlite_where=text("status IN ('active', 'contained')"),
+              postgresql_include=['process_name', 'id']),
         Index('idx_incidents_process', 'process_name', 'process_id'),
         Index('idx_incidents_time_range', 'start_time', 'end_time'),
     )
@@ -129,4 +135,7 @@ class Alert(Base):
     __table_args__ = (
         Index('idx_alerts_severity_ack', 'severity', 'acknowledged'),
         Index('idx_alerts_type_time', 'alert_type', 'timestamp'),
+        # Partial index for the unacknowledged-alerts triage query
+        Index('idx_alerts_unacknowledged', 'timestamp',
+              postgresql_where=text("acknowledged = false"), sqlite_where=text("acknowledged = 0")),
     )
@@ -1,12 +1,39 @@
 import logging
 import os
 from typing import List, Dict, Optional
-from datetime import datetime, timezone, timedelta
-from collections import defaultdict
+from datetime import timedelta
+from collections import OrderedDict, deque
 import asyncio
+import time
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on tracked process IDs; short-lived PIDs would otherwise accumulate forever
+MAX_TRACKED_PROCESSES = 10_000
+
+
+class _LRUTracker(OrderedDict):
+    """defaultdict-like mapping that evicts the least recently used process once full"""
+
+    def __init__(self, default_factory, max_entries: int = MAX_TRACKED_PROCESSES):
+        super().__init__()
+        self.default_factory = default_factory
+        self.max_entries = max_entries
+
+    def __missing__(self, key):
+        value = self[key] = self.default_factory()
+        return value
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.max_entries:
+            self.popitem(last=False)
+
 
 class RansomwareDetector:
     """Advanced ransomware detection engine with multiple heuristics"""
@@ -20,14 +47,19 @@ class RansomwareDetector:
         self.rapid_change_threshold = config.get("detection", {}).get("rapid_change_threshold", 50)
         self.extension_change_threshold = config.get("detection", {}).get("extension_change_threshold", 10)
         
+        # Suspicious extensions, lowercased without the leading dot for suffix lookups
+        self.suspicious_extensions = frozenset(
+            ext.lower().lstrip(".") for ext in config.get("detection", {}).get("suspicious_extensions", [])
+        )
+        
         # Tracking structures
-        self.file_modifications = defaultdict(list)
-        self.process_activity = defaultdict(int)
-        self.extension_changes = defaultdict(int)
+        self.file_modifications = _LRUTracker(deque)
+        self.process_activity = _LRUTracker(int)
+        self.extension_changes = _LRUTracker(int)
         self.suspicious_processes = set()
         
-        # Detection window (5 minutes)
-        self.detection_window = timedelta(minutes=5)
+        # Detection window (5 minutes), in ns to match event timestamps
+        self.detection_window = int(timedelta(minutes=5).total_seconds() * 1_000_000_000)
     
     async def analyze_event(self, event_data: dict) -> dict:
         """
@@ -37,7 +69,7 @@ class RansomwareDetector:
         try:
             file_path = event_data.get("path")
             event_type = event_data.get("type")
-            timestamp = event_data.get("timestamp", datetime.now(timezone.utc))
+            timestamp = event_data.get("timestamp") or time.time_ns()
             process_info = event_data.get("process", {})
             integrity_info = event_data.get("integrity", {})
             
@@ -87,15 +119,15 @@ class RansomwareDetector:
                     # Don't track our own file operations
                     return detection_result
             
-            self.file_modifications[process_id].append(timestamp)
+            modifications = self.file_modifications[process_id]
+            modifications.append(timestamp)
             
-            # Clean old entries
+            # Clean old entries (timestamps arrive in order, so expire from the left)
             cutoff_time = timestamp - self.detection_window
-            self.file_modifications[process_id] = [
-                t for t in self.file_modifications[process_id] if t > cutoff_time
-            ]
+            while modifications and modifications[0] <= cutoff_time:
+                modifications.popleft()
             
-            modification_rate = len(self.file_modifications[process_id])
+            modification_rate = len(modifications)
             if modification_rate > self.rapid_change_threshold:
                 indicators.append("rapid_file_modifications")
                 threat_score += 40
@@ -107,7 +139,7 @@ class RansomwareDetector:
                 threat_score += 35
             
             # 6. Check for suspicious file patterns
-            if any(ext in file_path.lower() for ext in self.config.get("detection", {}).get("suspicious_extensions", [])):
+            if os.path.splitext(file_path)[1].lower().lstrip(".") in self.suspicious_extensions:
                 indicators.append("suspicious_extension")
                 threat_score += 25
             
@@ -167,9 +199,13 @@ class RansomwareDetector:
         return suspicious
     
     def reset_tracking(self):
-        """Reset all tracking data"""
-        self.file_modifications.clear()
-        self.process_activity.clear()
-        self.extension_changes.clear()
-        self.suspicious_processes.clear()
+        """
+        Reset all tracking data.
+        Rebinds fresh containers instead of clearing in place, so an in-flight
+        analyze_event keeps its old reference and the old maps are freed together.
+        """
+        self.file_modifications = _LRUTracker(deque)
+        self.process_activity = _LRUTracker(int)
+        self.extension_changes = _LRUTracker(int)
+        self.suspicious_processes = set()
         logger.info("Detection tracking data reset")
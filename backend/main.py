@@ -14,7 +14,7 @@ from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.file_monitor import FileSystemMonitor
+from core.file_monitor import FileSystemMonitor, format_timestamp_ns
 from core.decoy_manager import DecoyFileManager
 from core.file_protector import FileProtector
 from core.usb_monitor import USBDriveMonitor
@@ -59,7 +59,9 @@ with open(config_path, 'r') as f:
 active_incidents: Dict[str, dict] = {}
 connected_clients: Set[WebSocket] = set()
 system_running: bool = True  # System monitoring state
-event_queue: asyncio.Queue = asyncio.Queue()
+EVENT_QUEUE_MAX_SIZE = 10000  # Producers wait (backpressure) once this many events are pending
+EVENT_BATCH_SIZE = 500  # File events written per INSERT/commit
+event_queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_MAX_SIZE)
 
 
 @asynccontextmanager
@@ -198,7 +200,8 @@ async def lifespan(app: FastAPI):
         file_event_callback,
         loop=loop,
         file_protector=app.state.file_protector,
-        monitoring_config=app.state.monitoring_config
+        monitoring_config=app.state.monitoring_config,
+        prime_baseline=config.get("monitoring", {}).get("prime_baseline", False)
     )
     app.state.monitor.start()
     
@@ -256,19 +259,16 @@ async def lifespan(app: FastAPI):
                 first_event = await event_queue.get()
                 events_to_insert.append(first_event)
 
-                # Collect more events if available (up to 100 or until queue empty)
-                while len(events_to_insert) < 100:
+                # Collect more events if available (up to EVENT_BATCH_SIZE or until queue empty)
+                while len(events_to_insert) < EVENT_BATCH_SIZE:
                     try:
                         next_event = event_queue.get_nowait()
                         events_to_insert.append(next_event)
                     except asyncio.QueueEmpty:
                         break
 
-                # Batch insert
-                async with db.async_session() as session:
-                    for event_obj in events_to_insert:
-                        session.add(event_obj)
-                    await session.commit()
+                # Batch insert: one executemany INSERT and one commit per batch
+                await db.batch_insert_events(events_to_insert)
 
                 for _ in range(len(events_to_insert)):
                     event_queue.task_done()
@@ -358,18 +358,18 @@ async def handle_file_event(event_data: dict):
                 "recommended_action": "monitor"
             }
         
-        # Queue event for batch database insertion
-        file_event = FileEvent(
-            event_type=event_data.get("type"),
-            file_path=event_data.get("path"),
-            file_hash=event_data.get("integrity", {}).get("current_hash") if event_data.get("integrity") else None,
-            entropy=event_data.get("integrity", {}).get("current_entropy") if event_data.get("integrity") else None,
-            process_name=event_data.get("process", {}).get("name") if event_data.get("process") else None,
-            process_id=event_data.get("process", {}).get("pid") if event_data.get("process") else None,
-            suspicious=detection_result.get("suspicious", False),
-            threat_level=detection_result.get("threat_level", "none"),
-            is_decoy=app.state.decoy_manager.is_decoy_file(event_data.get("path"))
-        )
+        # Queue event row for batch database insertion (plain dict, no ORM object)
+        file_event = {
+            "event_type": event_data.get("type"),
+            "file_path": event_data.get("path"),
+            "file_hash": event_data.get("integrity", {}).get("current_hash") if event_data.get("integrity") else None,
+            "entropy": event_data.get("integrity", {}).get("current_entropy") if event_data.get("integrity") else None,
+            "process_name": event_data.get("process", {}).get("name") if event_data.get("process") else None,
+            "process_id": event_data.get("process", {}).get("pid") if event_data.get("process") else None,
+            "suspicious": detection_result.get("suspicious", False),
+            "threat_level": detection_result.get("threat_level", "none"),
+            "is_decoy": app.state.decoy_manager.is_decoy_file(event_data.get("path"))
+        }
         await event_queue.put(file_event)
         
         # Handle threats
@@ -384,7 +384,7 @@ async def handle_file_event(event_data: dict):
                 "event_type": event_data.get("type"),
                 "threat_level": detection_result.get("threat_level"),
                 "indicators": detection_result.get("indicators"),
-                "timestamp": event_data.get("timestamp").isoformat()
+                "timestamp": format_timestamp_ns(event_data.get("timestamp"))
             }
         })
         
@@ -1009,7 +1009,7 @@ async def delete_decoy(decoy_path: str):
             logger.info(f"Deleted decoy file: {decoy_path}")
         
         # Remove from in-memory registry
-        del app.state.decoy_manager.decoy_registry[decoy_path]
+        app.state.decoy_manager.remove_decoy_entry(decoy_path)
         
         logger.info(f"Deleted decoy completely: {decoy_path}")
         
@@ -1057,7 +1057,7 @@ async def delete_all_decoys():
                     os.remove(decoy_path)
                 
                 # Remove from registry
-                del app.state.decoy_manager.decoy_registry[decoy_path]
+                app.state.decoy_manager.remove_decoy_entry(decoy_path)
                 deleted_count += 1
             except Exception as e:
                 logger.error(f"Failed to delete file {decoy_path}: {e}")
@@ -1171,21 +1171,7 @@ async def update_containment_settings(settings: dict):
     """Update containment settings"""
     try:
         # Update in-memory settings
-        if "auto_contain" in settings:
-            app.state.containment.auto_contain = settings["auto_contain"]
-            app.state.containment.containment_config["auto_contain"] = settings["auto_contain"]
-        
-        if "isolate_network" in settings:
-            app.state.containment.containment_config["isolate_network"] = settings["isolate_network"]
-        
-        if "kill_process" in settings:
-            app.state.containment.containment_config["kill_process"] = settings["kill_process"]
-        
-        if "disable_network_drives" in settings:
-            app.state.containment.containment_config["disable_network_drives"] = settings["disable_network_drives"]
-        
-        if "lock_system" in settings:
-            app.state.containment.containment_config["lock_system"] = settings["lock_system"]
+        app.state.containment.update_settings(settings)
         
         # Update config file
         config["containment"].update({k: v for k, v in settings.items() if k in config["containment"]})